@@ -25,6 +25,7 @@ class AvgTFRWindow(QDialog):
     def setup(self):
         self.set_canvas()
         self.set_box()
+        self.set_itc_box()
         self.set_bindings()
         self.set_slider()
         self.value_changed()
@@ -59,6 +60,15 @@ class AvgTFRWindow(QDialog):
             self.ui.displayBox.addItem('Topomap plot')
         self.plotType = 'Time-Frequency plot'
 
+    # ---------------------------------------------------------------------
+    def set_itc_box(self):
+        """Setup the check box displaying the inter-trial coherence. If it
+        was not computed with the power, it is computed when checked
+        """
+        self.ui.itc = QCheckBox(self.ui.frame)
+        self.ui.itc.setText('ITC')
+        self.ui.horizontalLayout_5.addWidget(self.ui.itc)
+
     # ---------------------------------------------------------------------
     def set_slider(self):
         """Setup the main slider
@@ -90,6 +100,7 @@ class AvgTFRWindow(QDialog):
         self.ui.displayBox.currentIndexChanged.connect(self.update_slider)
         self.ui.mainSlider.valueChanged.connect(self.value_changed)
         self.ui.log.stateChanged.connect(self.value_changed)
+        self.ui.itc.stateChanged.connect(self.value_changed)
 
     # Updating functions
     # =====================================================================
@@ -98,6 +109,7 @@ class AvgTFRWindow(QDialog):
         """
         self.index = self.ui.mainSlider.value()
         self.log = self.ui.log.checkState()
+        self.itc = self.ui.itc.checkState()
         try:
             self.fmax = float(self.ui.fmax.text())
             if self.fmax > self.avg.tfr.freqs[-1]:
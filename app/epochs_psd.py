@@ -122,8 +122,6 @@ class EpochsPSDWindow(QDialog):
     def value_changed(self):
         """ Get called if a value is changed
         """
-        from backend.util import get_index_freq
-
         try:
             fmin = float(self.ui.fmin.text())
         except ValueError:
@@ -132,8 +130,7 @@ class EpochsPSDWindow(QDialog):
             fmax = float(self.ui.fmax.text())
         except ValueError:
             fmax = self.psd.freqs[-1]
-        self.f_index_min, self.f_index_max = get_index_freq(
-                                                self.psd.freqs, fmin, fmax)
+        self.f_index_min, self.f_index_max = self.psd.band_index(fmin, fmax)
         try:
             self.vmax = float(self.ui.vmax.text())
         except ValueError:
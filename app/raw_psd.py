@@ -120,8 +120,6 @@ class RawPSDWindow(QDialog):
     def value_changed(self):
         """ Get called if a value is changed
         """
-        from backend.util import get_index_freq
-
         try:
             fmin = float(self.ui.fmin.text())
         except ValueError:
@@ -131,8 +129,7 @@ class RawPSDWindow(QDialog):
             fmax = float(self.ui.fmax.text())
         except ValueError:
             fmax = self.psd.freqs[-1]
-        self.f_index_min, self.f_index_max = get_index_freq(
-                                                 self.psd.freqs, fmin, fmax)
+        self.f_index_min, self.f_index_max = self.psd.band_index(fmin, fmax)
         try:
             self.vmax = float(self.ui.vmax.text())
         except ValueError:
@@ -15,6 +15,12 @@ class TimeFreq(QMainWindow):
         self.ui.retranslateUi(self)
         self.setup_ui()
 
+    # ---------------------------------------------------------------------
+    def closeEvent(self, event):
+        """Stop the threads reading the next files before closing"""
+        self.prefetcher.shutdown()
+        super(TimeFreq, self).closeEvent(event)
+
     # Setup functions for UI
     # ========================================================================
     def setup_ui(self):
@@ -22,14 +28,29 @@ class TimeFreq(QMainWindow):
         self.type = None
         self.selected_ch = []
         self.montage = None
+        # Only read the header when a file is opened, the samples are
+        # read by the PSD and TFR computations
+        self.preload = False
+        self.init_cache()
         self.set_bindings()
         self.setup_boxes()
         self.init_parameters()
 
+    # ---------------------------------------------------------------------
+    def init_cache(self, max_bytes=2e9, max_items=16, n_ahead=2):
+        """Init the cache of the loaded datasets, and the prefetcher reading
+        the next files of the selection
+        """
+        from backend.cache import DataCache, Prefetcher
+        self.cache = DataCache(max_bytes=max_bytes, max_items=max_items,
+                               preload=self.preload)
+        self.prefetcher = Prefetcher(self.cache, n_ahead=n_ahead)
+
     # ---------------------------------------------------------------------
     def setup_boxes(self):
         """Setup the boxes with names"""
         self.ui.psdMethod.addItem('welch')
+        self.ui.psdMethod.addItem('welch (numpy)')
         self.ui.psdMethod.addItem('multitaper')
         self.ui.tfrMethodBox.addItem('stockwell')
         self.ui.tfrMethodBox.addItem('morlet')
@@ -89,21 +110,18 @@ class TimeFreq(QMainWindow):
 
     # ---------------------------------------------------------------------
     def read_data(self):
-        """Reads the data from path
+        """Reads the data from path, or get it from the cache if the file
+        was already read
         """
         index = self.ui.dataFilesBox.currentIndex()
-        if self.filePaths[index].endswith('-epo.fif'):
-            from mne import read_epochs
-            self.type = 'epochs'
-            self.data = read_epochs(self.filePaths[index])
+        entry = self.cache.get(self.filePaths[index])
+        self.type, self.data = entry['type'], entry['data']
+        self.montage = entry['montage']
+        self.info_string = entry['info']
+        if self.type == 'epochs':
             print('Epoch file initialized')
-        elif self.filePaths[index].endswith('.fif'):
-            from mne.io import read_raw_fif
-            self.type = 'raw'
-            self.data = read_raw_fif(self.filePaths[index])
-            print('Raw file initialized')
         else:
-            raise TypeError("Type not handled")
+            print('Raw file initialized')
 
     # ---------------------------------------------------------------------
     def set_data_box(self):
@@ -119,14 +137,17 @@ class TimeFreq(QMainWindow):
     def data_box_changed(self):
         """Re-initialize the data when the value in the box is changed
         """
-        from backend.util import eeg_to_montage
         try:
             self.read_data()
             self.set_informations()
-            self.montage = eeg_to_montage(self.data)
             self.selected_ch = [name for name in self.data.info['ch_names']]
         except TypeError:
             print("File not handled")
+        except (OSError, ValueError) as e:
+            print(e)
+            print('Error while trying to read data')
+        self.prefetcher.prefetch(self.filePaths,
+                                 self.ui.dataFilesBox.currentIndex())
 
     # ---------------------------------------------------------------------
     def plot_data(self):
@@ -145,8 +166,7 @@ class TimeFreq(QMainWindow):
     def set_informations(self):
         """Set informations in the information label
         """
-        from backend.util import init_info_string
-        self.ui.infoLabel.setText(init_info_string(self.data))
+        self.ui.infoLabel.setText(self.info_string)
 
     # Parameters initialization
     # ========================================================================
@@ -7,6 +7,11 @@ class AvgEpochsTFR:
     ============
     picks       (array[int])   : Contains the picked channels
     tfr         (EpochsTFR)    : Contains the EpochsTFR data computed by mne
+    itc         (AverageTFR)   : Inter-trial coherence, computed on first
+                                  access if it was not requested at
+                                  initialization
+    tfr_var     (AverageTFR)   : Variance of the power over the epochs, if
+                                  variance is True
 
 
     Methods:
@@ -15,18 +20,43 @@ class AvgEpochsTFR:
     plot_time_freq             : Plot the time-frequency display
     plot_freq_ch               : Plot the frequency-channel display
     plot_time_ch               : Plot the time-channel display
+    display_data               : Returns a slice of the power or ITC, in
+                                  dB relative to its mean if asked
+
+    The plotting functions display the inter-trial coherence instead of
+    the power if itc is True.
     """
     # ------------------------------------------------------------------------
     def __init__(self, epochs, freqs, n_cycles, method='multitaper',
-                 time_bandwidth=4., n_fft=512, width=1, picks=None):
+                 time_bandwidth=4., n_fft=512, width=1, picks=None,
+                 itc=False, n_jobs=1, decim=1, batch_size=None,
+                 variance=False, dtype='float64', block_size=16,
+                 montage=None):
         """
         Initialize the class with an instance of EpochsTFR corresponding
-        to the method
+        to the method. The inter-trial coherence is only computed if itc
+        is True. The channels are split across n_jobs processes. Only one
+        time point every decim is computed and stored. If
+        batch_size is set, the epochs are read from the file batch by batch
+        and only running sums are kept, so the memory used does not depend
+        on the number of epochs. If variance is True, the variance of the
+        power over the epochs is accumulated too (multitaper and morlet).
+        With dtype='float32', the TFR is computed and stored in single
+        precision. The stockwell transform is computed by blocks of
+        block_size frequencies. montage gives the positions of the
+        electrodes for the topomaps.
         """
-        from backend.util import eeg_to_montage
-
         self.cmap = 'jet'
         self.info = epochs.info
+        self.method = method
+        self.freqs, self.n_cycles = freqs, n_cycles
+        self.time_bandwidth = time_bandwidth
+        self.n_fft, self.width = n_fft, width
+        self.n_jobs = n_jobs
+        self.decim = decim
+        self.dtype = dtype
+        self.block_size = block_size
+        self.batch_size = batch_size
 
         if picks is not None:
             self.picks = picks
@@ -39,122 +69,264 @@ class AvgEpochsTFR:
             except Exception as e:
                 print(e)
 
-        montage = eeg_to_montage(epochs)
         if montage is not None:
-            # First we create variable head_pos for a correct plotting
-            self.pos = montage.get_pos2d()
-            scale = 0.85 / (self.pos.max(axis=0) - self.pos.min(axis=0))
-            center = 0.5 * (self.pos.max(axis=0) + self.pos.min(axis=0))
-            self.head_pos = {'scale': scale, 'center': center}
-
-            # Handling of possible channels without any known coordinates
-            no_coord_channel = False
-            try:
-                names = montage.ch_names
-                indices = [names.index(epochs.info['ch_names'][i])
-                           for i in self.picks]
-                self.pos = self.pos[indices, :]
-            except Exception as e:
-                print(e)
-                no_coord_channel = True
-
-            # If there is not as much positions as the number of Channels
-            # we have to eliminate some channels from the data of topomaps
-            if no_coord_channel:
-                from mne.channels import read_montage
-                from numpy import array
-
-                index = 0
-                self.pos = []           # positions
-                # index in the self.data of channels with coordinates
-                self.with_coord = []
-
-                for i in self.picks:
-                    ch_name = epochs.info['ch_names'][i]
-                    try:
-                        ch_montage = read_montage(
-                            montage.kind, ch_names=[ch_name])
-                        coord = ch_montage.get_pos2d()
-                        self.pos.append(coord[0])
-                        self.with_coord.append(index)
-                    except Exception as e:
-                        print(e)
-                    index += 1
-                self.pos = array(self.pos)
-
-            else:
-                self.with_coord = [i for i in range(len(self.picks))]
+            # Positions of the picked channels with known coordinates, the
+            # montage being parsed only once
+            from backend.cache import montage_cache
+
+            ch_names = [epochs.info['ch_names'][i] for i in self.picks]
+            self.pos, self.with_coord, self.head_pos = montage_cache.resolve(
+                montage, ch_names)
 
         else:  # If there is no montage available
             self.head_pos = None
             self.with_coord = []
 
-        if method == 'multitaper':
-            from mne.time_frequency import tfr_multitaper
-            self.tfr, _ = tfr_multitaper(epochs, freqs, n_cycles,
-                                         time_bandwidth=time_bandwidth,
-                                         picks=self.picks)
-
-        if method == 'morlet':
-            from mne.time_frequency import tfr_morlet
-            self.tfr, _ = tfr_morlet(epochs, freqs, n_cycles,
-                                     picks=self.picks)
-
-        if method == 'stockwell':
-            from mne.time_frequency import tfr_stockwell
-            # The stockwell function does not handle picks like the two other
-            # ones ...
-            picked_ch_names = [epochs.info['ch_names'][i] for i in self.picks]
-            picked = epochs.copy().pick_channels(picked_ch_names)
-            self.tfr = tfr_stockwell(picked, fmin=freqs[0], fmax=freqs[-1],
-                                     n_fft=n_fft, width=width)
+        # dB values of the power and of the ITC, computed once
+        self._db = {}
+        # Renderer of the topomaps, built on first use
+        self._topomap = None
+        self.tfr, self._itc, self.tfr_var = self._compute(
+            epochs, return_itc=itc, return_var=variance)
+        # Kept to compute the ITC on demand. The epochs are usually read
+        # lazily, so this keeps their file open and the instance alive as
+        # long as the window, until the ITC is computed
+        self._epochs = None if itc else epochs
+
+    # ------------------------------------------------------------------------
+    @property
+    def itc(self):
+        """Inter-trial coherence, computed on first access if needed"""
+        if self._itc is None:
+            _, self._itc, _ = self._compute(self._epochs, return_itc=True)
+            self._epochs = None
+        return self._itc
+
+    # ------------------------------------------------------------------------
+    def _renderer(self):
+        """Returns the renderer of the topomaps of the electrodes"""
+        from backend.topomap import TopomapRenderer
+
+        if self._topomap is None:
+            self._topomap = TopomapRenderer(self.pos, self.head_pos)
+        return self._topomap
+
+    # ------------------------------------------------------------------------
+    def _store_key(self):
+        """Returns the parameters on which the TFR depends"""
+        from numpy import atleast_1d
+
+        params = (self.method, tuple(self.freqs),
+                  tuple(atleast_1d(self.n_cycles)), self.decim, self.dtype)
+        if self.method == 'multitaper':
+            return params + (self.time_bandwidth,)
+        if self.method == 'stockwell':
+            return params + (self.n_fft, self.width)
+        return params
+
+    # ------------------------------------------------------------------------
+    def _compute(self, epochs, return_itc=False, return_var=False):
+        """Returns the power with the inter-trial coherence and the variance
+        of the power over epochs, which are None if they are not requested.
+        The power, the ITC and the variance are stored channel by channel
+        under their own keys, so that only the channels and the kinds never
+        computed are when the picks change or when the ITC is requested
+        """
+        from functools import partial
+        from mne import pick_info
+        from mne.time_frequency import AverageTFR
+        from backend.cache import spectrum_store
+
+        if return_var and self.method == 'stockwell':
+            print('The variance is not available with the stockwell method')
+            return_var = False
+        kinds = (('power',) + (('itc',) if return_itc else ())
+                 + (('var',) if return_var else ()))
+        # Results of the last computation, kind -> (channels, data, meta)
+        computed = {}
+
+        def compute(kind, channels):
+            done = computed.get(kind)
+            if done is None or not set(channels) <= set(done[0]):
+                # The next kinds usually miss the same channels, and they
+                # come from the same convolutions
+                todo = kinds[kinds.index(kind):]
+                itc, var = 'itc' in todo, 'var' in todo
+                data, (times, freqs, nave, methods) = self._compute_channels(
+                    epochs, channels, itc, var)
+                names = (('power',) + (('itc',) if itc else ())
+                         + (('var',) if var else ()))
+                for name, values, method in zip(
+                        names, data if len(names) > 1 else [data], methods):
+                    computed[name] = (channels, values,
+                                      (times, freqs, nave, method))
+                done = computed[kind]
+            done_channels, values, meta = done
+            if done_channels != channels:
+                values = values.take([done_channels.index(channel)
+                                      for channel in channels], axis=-3)
+            return values, meta
+
+        info = pick_info(epochs.info, self.picks)
+        tfrs = {}
+        for kind in kinds:
+            data, (times, freqs, nave, method) = spectrum_store.get(
+                epochs, self._store_key() + (kind,), self.picks,
+                partial(compute, kind), axis=-3)
+            tfrs[kind] = AverageTFR(info, data, times, freqs, nave=nave,
+                                    method=method)
+        return tfrs['power'], tfrs.get('itc'), tfrs.get('var')
+
+    # ------------------------------------------------------------------------
+    def _compute_channels(self, epochs, picks, return_itc=False,
+                          return_var=False):
+        """Computes the power with the method of the instance for the
+        channels of picks. Returns the power, stacked with the inter-trial
+        coherence and the variance if they are requested, and the times,
+        frequencies, number of averaged epochs and methods of the
+        AverageTFR
+        """
+        from numpy import stack
+
+        freqs, n_cycles = self.freqs, self.n_cycles
+
+        if self.method == 'multitaper':
+            # Same as mne tfr_multitaper, with cached tapers
+            from backend.tfr import tfr_multitaper_avg
+            tfr = tfr_multitaper_avg(epochs, freqs, n_cycles,
+                                     time_bandwidth=self.time_bandwidth,
+                                     picks=picks, return_itc=return_itc,
+                                     n_jobs=self.n_jobs,
+                                     batch_size=self.batch_size,
+                                     return_var=return_var,
+                                     decim=self.decim, dtype=self.dtype)
+
+        if self.method == 'morlet':
+            # Same as mne tfr_morlet, with cached wavelets
+            from backend.tfr import tfr_morlet_avg
+            tfr = tfr_morlet_avg(epochs, freqs, n_cycles,
+                                 picks=picks, return_itc=return_itc,
+                                 n_jobs=self.n_jobs,
+                                 batch_size=self.batch_size,
+                                 return_var=return_var,
+                                 decim=self.decim, dtype=self.dtype)
+
+        if self.method == 'stockwell':
+            # Same as mne tfr_stockwell, by blocks of frequencies
+            from backend.tfr import tfr_stockwell_avg
+            tfr = tfr_stockwell_avg(epochs, fmin=freqs[0], fmax=freqs[-1],
+                                    n_fft=self.n_fft, width=self.width,
+                                    picks=picks, decim=self.decim,
+                                    return_itc=return_itc,
+                                    n_jobs=self.n_jobs,
+                                    block_size=self.block_size,
+                                    dtype=self.dtype)
+
+        tfrs = tfr if isinstance(tfr, tuple) else (tfr,)
+        data = stack([t.data for t in tfrs]) if len(tfrs) > 1 else tfr.data
+        meta = (tfrs[0].times, tfrs[0].freqs, tfrs[0].nave,
+                tuple(t.method for t in tfrs))
+        return data, meta
+
+    # ------------------------------------------------------------------------
+    def display_data(self, index, log_display=False, itc=False):
+        """
+        Returns the slice index of the power, or of the ITC if itc is True.
+        With log_display, it is given in dB relative to the mean of the
+        slice, as 10 * log(data / mean(data)). The logarithm of the whole
+        matrix is computed once, and only the mean of the slice is taken
+        for each display.
+        """
+        from numpy import log
+
+        tfr = self.itc if itc else self.tfr
+        data = tfr.data[index]
+        if not log_display:
+            return data
+        db = self._db.get(itc)
+        if db is None:
+            db = 10 * log(tfr.data)
+            db.flags.writeable = False
+            self._db[itc] = db
+        return db[index] - 10 * log(data.mean())
 
     # ------------------------------------------------------------------------
     def plot_time_freq(self, index_channel, ax,
-                       vmin=None, vmax=None, log_display=False):
+                       vmin=None, vmax=None, log_display=False,
+                       itc=False, image=None):
         """
-        Plot the averaged epochs time-frequency plot for a given channel
+        Plot the averaged epochs time-frequency plot for a given channel.
+        Frequencies which are not evenly spaced are drawn as cells centered
+        on each frequency, on a log axis if they are log-spaced. If image
+        was drawn before, only its data is updated.
         """
         from matplotlib.pyplot import imshow
-        from numpy import log, mean
+        from backend.util import _axis_edges
 
-        data = self.tfr.data[index_channel, :, :]
-        if log_display:
-            data = 10 * log(data / mean(data))
-        extent = [self.tfr.times[0], self.tfr.times[-1],
-                  self.tfr.freqs[0], self.tfr.freqs[-1]]
+        tfr = self.itc if itc else self.tfr
+        data = self.display_data((index_channel, slice(None), slice(None)),
+                                 log_display, itc)
+        if image is not None:
+            from backend.util import _set_image
+
+            return _set_image(image, data, vmin, vmax)
+        freq_edges, scale = _axis_edges(tfr.freqs)
+        if scale != 'uniform':
+            time_edges, _ = _axis_edges(tfr.times)
+            ax.set_yscale('log' if scale == 'log' else 'linear')
+            return ax.pcolormesh(time_edges, freq_edges, data, vmax=vmax,
+                                 vmin=vmin, cmap=self.cmap)
+        extent = [tfr.times[0], tfr.times[-1],
+                  tfr.freqs[0], tfr.freqs[-1]]
         return ax.imshow(data, extent=extent, aspect='auto',
                          origin='lower', vmax=vmax, vmin=vmin, cmap=self.cmap)
 
     # ------------------------------------------------------------------------
     def plot_freq_ch(self, time_index, ax,
-                     vmin=None, vmax=None, log_display=False):
-        """Plot the averaged epochs frequency-channel plot for a given time"""
+                     vmin=None, vmax=None, log_display=False,
+                     itc=False, image=None):
+        """Plot the averaged epochs frequency-channel plot for a given time.
+        If image was drawn before, only its data is updated.
+        """
         from matplotlib.pyplot import imshow
-        from numpy import log, mean
+        from numpy import arange
+        from backend.util import _axis_edges
 
-        data = self.tfr.data[:, :, time_index]
-        if log_display:
-            data = 10 * log(data / mean(data))
-        extent = [self.tfr.freqs[0], self.tfr.freqs[-1],
+        tfr = self.itc if itc else self.tfr
+        data = self.display_data((slice(None), slice(None), time_index),
+                                 log_display, itc)
+        if image is not None:
+            from backend.util import _set_image
+
+            return _set_image(image, data, vmin, vmax)
+        freq_edges, scale = _axis_edges(tfr.freqs)
+        if scale != 'uniform':
+            ax.set_xscale('log' if scale == 'log' else 'linear')
+            return ax.pcolormesh(freq_edges, arange(len(self.picks) + 1) + .5,
+                                 data, vmax=vmax, vmin=vmin, cmap=self.cmap)
+        extent = [tfr.freqs[0], tfr.freqs[-1],
                   .5, len(self.picks)+.5]
         return ax.imshow(data, extent=extent, aspect='auto',
                          origin='lower', vmax=vmax, vmin=vmin, cmap=self.cmap)
 
     # ------------------------------------------------------------------------
     def plot_time_ch(self, freq_index, ax,
-                     vmin=None, vmax=None, log_display=False):
+                     vmin=None, vmax=None, log_display=False,
+                     itc=False, image=None):
         """
         Plot the averaged epochs time-channel plot for a given frequency
-        range
+        range. If image was drawn before, only its data is updated.
         """
         from matplotlib.pyplot import imshow
-        from numpy import log, mean
 
-        data = self.tfr.data[:, freq_index, :]
-        if log_display:
-            data = 10 * log(data / mean(data))
-        extent = [self.tfr.times[0], self.tfr.times[-1],
+        tfr = self.itc if itc else self.tfr
+        data = self.display_data((slice(None), freq_index, slice(None)),
+                                 log_display, itc)
+        if image is not None:
+            from backend.util import _set_image
+
+            return _set_image(image, data, vmin, vmax)
+        extent = [tfr.times[0], tfr.times[-1],
                   .5,                len(self.picks)+.5]
         return ax.imshow(data, extent=extent, aspect='auto',
                          origin='lower', vmax=vmax, vmin=vmin, cmap=self.cmap)
@@ -0,0 +1,633 @@
+from collections import OrderedDict
+from threading import Lock, RLock
+
+
+# ---------------------------------------------------------------------
+def file_key(path):
+    """Returns a key identifying the content of a file, made of its path,
+    its modification time and its size
+    """
+    from os import stat
+
+    st = stat(path)
+    return (path, st.st_mtime, st.st_size)
+
+
+# ---------------------------------------------------------------------
+def _data_nbytes(data):
+    """Returns the memory used by the samples of a mne instance, which is
+    zero if the samples are not loaded
+    """
+    samples = getattr(data, '_data', None)
+    if getattr(data, 'preload', False) and samples is not None:
+        return samples.nbytes
+    return 0
+
+
+class DataCache:
+    """
+    This class is a least recently used cache of the loaded datasets. For
+    each file, it stores the mne instance with the montage and the
+    informations string derived from it, so that switching back to an
+    already opened file does not read and parse it again. Entries are
+    identified by the path, the modification time and the size of the
+    file, so a modified file is read again. The memory used by the
+    samples is measured when the entries are evicted, so the samples
+    loaded after the insertion are accounted for. The same mne instance is
+    returned for a file while it is cached, so the changes made to it, as
+    the bad channels marked in its plot, are kept when switching back to
+    the file.
+
+    Attributes:
+    ============
+    max_bytes   (int)          : memory budget for the loaded samples
+
+    nbytes      (int)          : memory used by the loaded samples
+
+    max_items   (int)          : maximum number of datasets kept
+
+    preload     (bool | str)   : preload argument used to read the files
+
+    Methods:
+    ============
+    get                        : Returns the entry of a file, reading it
+                                  if needed
+
+    clear                      : Remove all the entries
+
+    cancel                     : Cancel the background reads not started
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, max_bytes=2e9, max_items=16, preload=False):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.preload = preload
+        self._entries = OrderedDict()
+        self._pending = {}      # files being read in background
+        self._lock = Lock()
+
+    # ------------------------------------------------------------------------
+    def __len__(self):
+        return len(self._entries)
+
+    # ------------------------------------------------------------------------
+    @property
+    def nbytes(self):
+        """Memory used by the samples loaded in the cached instances"""
+        with self._lock:
+            return sum(_data_nbytes(entry['data'])
+                       for entry in self._entries.values())
+
+    # ------------------------------------------------------------------------
+    def get(self, path):
+        """Returns the entry corresponding to path. The entry is a dict
+        with the keys 'type', 'data', 'montage' and 'info'. If
+        the file is being prefetched, waits for the end of the reading.
+        """
+        key = file_key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+            future = self._pending.get(key)
+
+        if future is not None:
+            entry = future.result()
+        else:
+            entry = self.load(path)
+        self._insert(key, entry)
+        return entry
+
+    # ------------------------------------------------------------------------
+    def prefetch(self, path, executor, load_data=False):
+        """Read the file with executor in background and insert it in the
+        cache, if it is not already cached or being read. If load_data is
+        True, the samples are loaded too.
+        """
+        try:
+            key = file_key(path)
+        except OSError as e:
+            print(e)
+            return
+
+        with self._lock:
+            if key in self._entries or key in self._pending:
+                return
+            future = executor.submit(self.load, path, load_data)
+            self._pending[key] = future
+
+        def done(future):
+            with self._lock:
+                self._pending.pop(key, None)
+            if future.cancelled():
+                return
+            if future.exception() is None:
+                self._insert(key, future.result())
+            else:
+                print('Could not prefetch {}: {}'
+                      .format(path, future.exception()))
+
+        future.add_done_callback(done)
+
+    # ------------------------------------------------------------------------
+    def load(self, path, load_data=False):
+        """Read the file and compute the derived montage and informations
+        """
+        from backend.util import read_eeg, eeg_to_montage, init_info_string
+
+        data_type, data = read_eeg(path, preload=self.preload)
+        if load_data and not data.preload:
+            data.load_data()
+        return {'type': data_type,
+                'data': data,
+                'montage': eeg_to_montage(data),
+                'info': init_info_string(data)}
+
+    # ------------------------------------------------------------------------
+    def clear(self):
+        """Remove all the entries"""
+        with self._lock:
+            self._entries.clear()
+
+    # ------------------------------------------------------------------------
+    def cancel(self):
+        """Cancel the background reads which are not started"""
+        with self._lock:
+            futures = list(self._pending.values())
+        for future in futures:
+            future.cancel()
+
+    # ------------------------------------------------------------------------
+    def _insert(self, key, entry):
+        """Insert the entry as the most recently used one"""
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._evict()
+
+    # ------------------------------------------------------------------------
+    def _evict(self):
+        """Remove the least recently used entries until the cache fits
+        in its budget. The most recent entry is always kept. The samples
+        can be loaded after the insertion, so they are measured here.
+        """
+        sizes = [_data_nbytes(entry['data'])
+                 for entry in self._entries.values()]
+        nbytes = sum(sizes)
+        while (len(self._entries) > 1
+               and (len(self._entries) > self.max_items
+                    or nbytes > self.max_bytes)):
+            self._entries.popitem(last=False)
+            nbytes -= sizes.pop(0)
+
+
+class Prefetcher:
+    """
+    This class reads in background threads the files following the
+    current one in a selection of files, and stores them in a DataCache.
+    The user usually goes through the files in order, so the next file is
+    already parsed when it is selected.
+
+    Attributes:
+    ============
+    cache       (DataCache)    : cache in which the files are stored
+
+    n_ahead     (int)          : number of files read after the current one
+
+    load_data   (bool)         : if True, the samples are loaded too
+
+    Methods:
+    ============
+    prefetch                   : Read the files following a given index
+
+    shutdown                   : Cancel the reads not started and stop
+                                  the worker threads
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, cache, n_ahead=2, max_workers=2, load_data=False):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.cache = cache
+        self.n_ahead = n_ahead
+        self.load_data = load_data
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    # ------------------------------------------------------------------------
+    def prefetch(self, paths, index):
+        """Read in background the n_ahead files following paths[index]"""
+        for path in paths[index + 1: index + 1 + self.n_ahead]:
+            self.cache.prefetch(path, self.executor,
+                                load_data=self.load_data)
+
+    # ------------------------------------------------------------------------
+    def shutdown(self):
+        """Cancel the reads not started, and wait for the end of the worker
+        threads
+        """
+        self.cache.cancel()
+        self.executor.shutdown(wait=True)
+
+
+class TaperCache:
+    """
+    This class is a least recently used cache of the DPSS tapers, shared
+    by all the multitaper computations of the process. The tapers only
+    depend on the number of time points, the half bandwidth and the number
+    of tapers, so batch runs over files with the same epoch length compute
+    them only once. If cache_dir is set, the tapers are also saved on disk
+    and reused by the next sessions.
+
+    Attributes:
+    ============
+    max_items   (int)          : maximum number of taper sets kept
+
+    cache_dir   (str)          : directory where the tapers are saved
+
+    Methods:
+    ============
+    get                        : Returns the tapers and their eigenvalues
+
+    clear                      : Remove all the tapers from memory
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, max_items=64, cache_dir=None):
+        self.max_items = max_items
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    # ------------------------------------------------------------------------
+    def __len__(self):
+        return len(self._entries)
+
+    # ------------------------------------------------------------------------
+    def get(self, n_times, half_nbw, n_tapers):
+        """Returns the tapers of shape (n_tapers, n_times) and their
+        eigenvalues
+        """
+        key = (int(n_times), float(half_nbw), int(n_tapers))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        entry = self._read(key)
+        if entry is None:
+            from scipy.signal.windows import dpss
+
+            tapers, eigvals = dpss(key[0], key[1], key[2],
+                                   return_ratios=True)
+            tapers.flags.writeable = False
+            eigvals.flags.writeable = False
+            entry = (tapers, eigvals)
+            self._write(key, entry)
+
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+        return entry
+
+    # ------------------------------------------------------------------------
+    def clear(self):
+        """Remove all the tapers from memory"""
+        with self._lock:
+            self._entries.clear()
+
+    # ------------------------------------------------------------------------
+    def _file_name(self, key):
+        """Returns the path of the file containing the tapers of key"""
+        from os.path import join
+        return join(self.cache_dir,
+                    'dpss_{}_{!r}_{}.npz'.format(*key))
+
+    # ------------------------------------------------------------------------
+    def _read(self, key):
+        """Read the tapers from disk, returns None if not found"""
+        if self.cache_dir is None:
+            return None
+        from numpy import load
+        try:
+            with load(self._file_name(key)) as f:
+                tapers, eigvals = f['tapers'], f['eigvals']
+        except (OSError, KeyError):
+            return None
+        tapers.flags.writeable = False
+        eigvals.flags.writeable = False
+        return tapers, eigvals
+
+    # ------------------------------------------------------------------------
+    def _write(self, key, entry):
+        """Save the tapers on disk if cache_dir is set"""
+        if self.cache_dir is None:
+            return
+        from os import makedirs
+        from numpy import savez
+        try:
+            makedirs(self.cache_dir, exist_ok=True)
+            savez(self._file_name(key), tapers=entry[0], eigvals=entry[1])
+        except OSError as e:
+            print(e)
+
+
+# Cache of the DPSS tapers shared by the multitaper PSD and TFR
+taper_cache = TaperCache()
+
+
+class WaveletCache:
+    """
+    This class is a least recently used cache of the wavelet banks used
+    for the TFR, keyed by the method, the sampling frequency, the
+    frequencies and the number of cycles. When only the picks or the file
+    change, the wavelets and their Fourier transforms are reused.
+
+    Attributes:
+    ============
+    max_items   (int)          : maximum number of banks kept
+
+    Methods:
+    ============
+    get                        : Returns the bank of a key, building it
+                                  if needed
+
+    clear                      : Remove all the banks
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, max_items=16):
+        self.max_items = max_items
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    # ------------------------------------------------------------------------
+    def __len__(self):
+        return len(self._entries)
+
+    # ------------------------------------------------------------------------
+    def get(self, key, make):
+        """Returns the bank corresponding to key. If it is not cached, it
+        is built by calling make()
+        """
+        with self._lock:
+            bank = self._entries.get(key)
+            if bank is not None:
+                self._entries.move_to_end(key)
+                return bank
+
+        bank = make()
+        with self._lock:
+            self._entries[key] = bank
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+        return bank
+
+    # ------------------------------------------------------------------------
+    def clear(self):
+        """Remove all the banks"""
+        with self._lock:
+            self._entries.clear()
+
+
+# Cache of the wavelet banks shared by the TFR computations
+wavelet_cache = WaveletCache()
+
+
+class SpectrumStore:
+    """
+    This class keeps the results computed for a data instance and a set of
+    parameters (method, bandwidth or n_fft, tmin and tmax), channel by
+    channel. For the PSD, the spectrum is computed over all the
+    frequencies, so when only fmin and fmax change it is sliced without
+    copy. When the picks change, only the channels which were never
+    computed are, and the other ones are reused. The entries of an
+    instance are removed when it is garbage collected, and the least
+    recently used entries are removed above max_bytes.
+
+    Attributes:
+    ============
+    max_bytes   (int)          : memory budget for the stored results
+
+    Methods:
+    ============
+    get                        : Returns the results of a key for a list of
+                                  channels, computing the missing ones
+
+    clear                      : Remove all the results
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, max_bytes=1e9):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._watched = set()   # ids of the instances with a finalizer
+        self._lock = RLock()
+
+    # ------------------------------------------------------------------------
+    def __len__(self):
+        return len(self._entries)
+
+    # ------------------------------------------------------------------------
+    def get(self, inst, key, picks, compute, axis=-2):
+        """
+        Returns the read-only data stored for inst and key, for the
+        channels of picks along axis, with the metadata returned by
+        compute. The missing channels are computed by calling
+        compute(channels), with the channels in increasing order, which
+        must return the data of these channels and the metadata (the
+        frequencies for the PSD). If picks are the stored channels, the
+        data is returned without copy.
+        """
+        from numpy import concatenate
+
+        # mne instances are not hashable without their samples
+        key = (id(inst),) + tuple(key)
+        picks = [int(pick) for pick in picks]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                channels, data, meta = entry
+        if entry is None:
+            channels, data, meta = [], None, None
+
+        # In increasing order, as the channels picked by mne
+        missing = sorted(set(picks) - set(channels))
+        if missing:
+            new_data, meta = compute(missing)
+            if data is None:
+                channels, data = missing, new_data
+            else:
+                # Keep the channels sorted, as the picks usually are
+                merged = channels + missing
+                order = sorted(range(len(merged)), key=merged.__getitem__)
+                channels = [merged[i] for i in order]
+                data = concatenate((data, new_data), axis=axis)
+                data = data.take(order, axis=axis)
+            data.flags.writeable = False
+            with self._lock:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self.nbytes -= old[1].nbytes
+                self._entries[key] = (channels, data, meta)
+                self.nbytes += data.nbytes
+                self._watch(inst)
+                self._evict()
+
+        if picks == channels:
+            return data, meta
+        index = {channel: i for i, channel in enumerate(channels)}
+        data = data.take([index[pick] for pick in picks], axis=axis)
+        data.flags.writeable = False
+        return data, meta
+
+    # ------------------------------------------------------------------------
+    def clear(self):
+        """Remove all the results"""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    # ------------------------------------------------------------------------
+    def _watch(self, inst):
+        """Remove the entries of inst when it is garbage collected"""
+        from weakref import finalize
+
+        if id(inst) not in self._watched:
+            self._watched.add(id(inst))
+            finalize(inst, self._drop, id(inst))
+
+    # ------------------------------------------------------------------------
+    def _drop(self, inst_id):
+        """Remove all the entries of the instance inst_id"""
+        with self._lock:
+            self._watched.discard(inst_id)
+            for key in [key for key in self._entries if key[0] == inst_id]:
+                self.nbytes -= self._entries.pop(key)[1].nbytes
+
+    # ------------------------------------------------------------------------
+    def _evict(self):
+        """Remove the least recently used results until the store fits in
+        its budget. The most recent entry is always kept.
+        """
+        while len(self._entries) > 1 and self.nbytes > self.max_bytes:
+            _, (_, data, _) = self._entries.popitem(last=False)
+            self.nbytes -= data.nbytes
+
+
+# Store of the PSD and TFR results shared by the visualization windows
+spectrum_store = SpectrumStore()
+
+
+class MontageCache:
+    """
+    This class is a least recently used cache of the 2-D positions of the
+    electrodes of the montages. Each montage is projected once, with its
+    head_pos and the index of each channel name, and the standard montage
+    of each kind is parsed once for the channels missing from it. The
+    positions of the picked channels are then looked up by name for every
+    PSD and TFR.
+
+    Attributes:
+    ============
+    max_items   (int)          : maximum number of montages kept
+
+    Methods:
+    ============
+    resolve                    : Returns the positions, the indices of the
+                                  channels with coordinates and head_pos
+
+    clear                      : Remove all the montages
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, max_items=16):
+        self.max_items = max_items
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    # ------------------------------------------------------------------------
+    def __len__(self):
+        return len(self._entries)
+
+    # ------------------------------------------------------------------------
+    def resolve(self, montage, ch_names):
+        """Returns the 2-D positions of the channels of ch_names found in
+        montage, the indices in ch_names of these channels and the head_pos
+        of montage. If some channels are missing from montage, they are
+        looked up in the standard montage of the same kind.
+        """
+        from numpy import array, flatnonzero
+
+        pos, index, head_pos = self._get(('montage', id(montage)),
+                                         lambda: self._project(montage))
+        indices = array([index.get(name, -1) for name in ch_names],
+                        dtype=int)
+        if (indices < 0).any():
+            pos, index, _ = self._get(('kind', montage.kind),
+                                      lambda: self._read(montage.kind))
+            indices = array([index.get(name, -1) for name in ch_names],
+                            dtype=int)
+        with_coord = flatnonzero(indices >= 0)
+        return pos[indices[with_coord]], with_coord.tolist(), head_pos
+
+    # ------------------------------------------------------------------------
+    def clear(self):
+        """Remove all the montages"""
+        with self._lock:
+            self._entries.clear()
+
+    # ------------------------------------------------------------------------
+    def _get(self, key, make):
+        """Returns the entry of key, built by calling make() if needed"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[:3]
+
+        entry = make()
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+        return entry[:3]
+
+    # ------------------------------------------------------------------------
+    @staticmethod
+    def _project(montage):
+        """Returns the 2-D positions of montage, the index of each channel
+        name and head_pos. The montage is kept in the entry so that its id
+        is not reused while it is cached.
+        """
+        pos = montage.get_pos2d()
+        pos.flags.writeable = False
+        scale = 0.85 / (pos.max(axis=0) - pos.min(axis=0))
+        center = 0.5 * (pos.max(axis=0) + pos.min(axis=0))
+        head_pos = {'scale': scale, 'center': center}
+        index = {name: i for i, name in enumerate(montage.ch_names)}
+        return pos, index, head_pos, montage
+
+    # ------------------------------------------------------------------------
+    @staticmethod
+    def _read(kind):
+        """Parse the standard montage kind once, and returns the 2-D
+        positions of its channels with the index of each channel name. No
+        channel is found if the montage cannot be read.
+        """
+        from numpy import empty
+
+        try:
+            from mne.channels import read_montage
+
+            standard = read_montage(kind)
+            pos = standard.get_pos2d()
+            index = {name: i for i, name in enumerate(standard.ch_names)}
+        except Exception as e:
+            print(e)
+            pos, index = empty((0, 2)), {}
+        pos.flags.writeable = False
+        return pos, index, None
+
+
+# Cache of the electrode positions shared by the PSD and TFR topomaps
+montage_cache = MontageCache()
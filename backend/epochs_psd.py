@@ -26,10 +26,25 @@ class EpochsPSD:
 
     freqs       (arr.)         : list containing the frequencies of the psds
 
+    avg_data    (numpy arr.)   : psds averaged over epochs, of size
+                                  (n_channels, n_freqs), computed once
+
     Methods
     =========
     __init__                   : Compute all the PSD of each epoch
 
+    epochs_stat                : Returns the mean, std or median of the
+                                  psds over epochs, computed once
+
+    display_data               : Returns the psds or their average over
+                                  epochs, in dB if asked, computed once
+
+    band_index                 : Returns the indices of the frequencies of
+                                  a band
+
+    band_mean                  : Returns the psds averaged over a band of
+                                  frequencies, from cumulative sums
+
     plot_topomap               : Plot the map of the power for a given
                                   frequency and epoch
 
@@ -65,6 +80,17 @@ class EpochsPSD:
         self.n_fft = kwargs.get('n_fft', 256)
         self.n_per_seg = kwargs.get('n_per_seg', self.n_fft)
         self.n_overlap = kwargs.get('n_overlap', 0)
+        # Welch engine, 'mne' or the batched 'numpy' one
+        self.engine = kwargs.get('engine', 'mne')
+        # Precision in which the PSD is computed and stored
+        self.dtype = kwargs.get('dtype', 'float64')
+        # Frequencies computed instead of the whole spectrum
+        self.target_freqs = kwargs.get('target_freqs', None)
+        if self.target_freqs is not None:
+            # Only the engines of the project compute targeted frequencies
+            self.engine = 'numpy'
+        # Number of processes across which the channels are split
+        self.n_jobs = kwargs.get('n_jobs', 1)
         self.cmap = 'jet'
 
         if picks is not None:
@@ -79,80 +105,193 @@ class EpochsPSD:
                 print(e)
 
         if montage is not None:
-            # First we create variable head_pos for a correct plotting
-            self.pos = montage.get_pos2d()
-            scale = 0.85 / (self.pos.max(axis=0) - self.pos.min(axis=0))
-            center = 0.5 * (self.pos.max(axis=0) + self.pos.min(axis=0))
-            self.head_pos = {'scale': scale, 'center': center}
-
-            # Handling of possible channels without any known coordinates
-            no_coord_channel = False
-            try:
-                names = montage.ch_names
-                indices = [names.index(epochs.info['ch_names'][i])
-                           for i in self.picks]
-                self.pos = self.pos[indices, :]
-            except Exception as e:
-                print(e)
-                no_coord_channel = True
-
-            # If there is not as much positions as the number of Channels
-            # we have to eliminate some channels from the data of topomaps
-            if no_coord_channel:
-                from mne.channels import read_montage
-                from numpy import array
-
-                index = 0
-                self.pos = []           # positions
-                # index in the self.data of channels with coordinates
-                self.with_coord = []
-
-                for i in self.picks:
-                    ch_name = epochs.info['ch_names'][i]
-                    try:
-                        ch_montage = read_montage(
-                            montage.kind, ch_names=[ch_name])
-                        coord = ch_montage.get_pos2d()
-                        self.pos.append(coord[0])
-                        self.with_coord.append(index)
-                    except Exception as e:
-                        print(e)
-                    index += 1
-                self.pos = array(self.pos)
-
-            else:
-                self.with_coord = [i for i in range(len(self.picks))]
+            # Positions of the picked channels with known coordinates, the
+            # montage being parsed only once
+            from backend.cache import montage_cache
+
+            ch_names = [epochs.info['ch_names'][i] for i in self.picks]
+            self.pos, self.with_coord, self.head_pos = montage_cache.resolve(
+                montage, ch_names)
 
         else:  # If there is no montage available
             self.head_pos = None
             self.with_coord = []
 
-        if method == 'multitaper':
-            from mne.time_frequency import psd_multitaper
+        # Renderer of the topomaps, built on first use
+        self._topomap = None
+
+        # The PSD over all the frequencies is stored channel by channel, and
+        # sliced for further requests with other frequency bounds or picks
+        from backend.cache import spectrum_store
+        from backend.util import _freq_slice
+
+        data, freqs = spectrum_store.get(
+            epochs, self._store_key(), self.picks,
+            lambda picks: self._compute(epochs, picks))
+        index = _freq_slice(freqs, fmin, fmax)
+        self.data, self.freqs = data[..., index], freqs[index]
+
+    # ------------------------------------------------------------------------
+    @property
+    def data(self):
+        """psds of size (n_epochs, n_channels, n_freqs)"""
+        return self._data
+
+    # ------------------------------------------------------------------------
+    @data.setter
+    def data(self, data):
+        """Set the psds, and invalidate the statistics over epochs"""
+        self._data = data
+        self._stats = {}
+
+    # ------------------------------------------------------------------------
+    @property
+    def avg_data(self):
+        """psds averaged over epochs, of size (n_channels, n_freqs)"""
+        return self.epochs_stat('mean')
+
+    # ------------------------------------------------------------------------
+    def epochs_stat(self, stat='mean'):
+        """Returns the statistic of the psds over epochs, 'mean', 'std' or
+        'median', of size (n_channels, n_freqs). It is computed on the first
+        call, and reused until the data changes.
+        """
+        from numpy import median, std
+
+        value = self._stats.get(stat)
+        if value is None:
+            reduce = {'mean': mean, 'std': std, 'median': median}[stat]
+            value = reduce(self._data, axis=0)
+            value.flags.writeable = False
+            self._stats[stat] = value
+        return value
+
+    # ------------------------------------------------------------------------
+    def display_data(self, log_display=False, avg=False):
+        """Returns the psds, or the psds averaged over epochs if avg is True,
+        in dB if log_display is True. The dB values are computed once over
+        the whole matrix and shared by all the plots until the data changes.
+        """
+        data = self.avg_data if avg else self._data
+        if not log_display:
+            return data
+        key = 'db_avg' if avg else 'db'
+        value = self._stats.get(key)
+        if value is None:
+            value = 10 * log(data)
+            value.flags.writeable = False
+            self._stats[key] = value
+        return value
+
+    # ------------------------------------------------------------------------
+    def band_index(self, fmin, fmax):
+        """Returns the indices of the first and last frequencies of the
+        band between fmin and fmax, with a binary search in self.freqs
+        """
+        from backend.util import get_index_freq
+
+        return get_index_freq(self.freqs, fmin, fmax)
+
+    # ------------------------------------------------------------------------
+    def band_mean(self, freq_index_min, freq_index_max, epoch_index=None):
+        """Returns the psds of each channel averaged over the frequencies
+        between freq_index_min and freq_index_max (excluded), for the epoch
+        epoch_index, or averaged over epochs if it is None. The cumulative
+        sums over frequencies are computed once, so each band costs
+        O(n_channels) whatever its width.
+        """
+        from backend.util import _band_cumsum
+
+        key = 'cumsum' if epoch_index is not None else 'cumsum_avg'
+        cumsum = self._stats.get(key)
+        if cumsum is None:
+            cumsum = _band_cumsum(self._data if epoch_index is not None
+                                  else self.avg_data)
+            self._stats[key] = cumsum
+        if epoch_index is not None:
+            cumsum = cumsum[epoch_index]
+        return ((cumsum[:, freq_index_max] - cumsum[:, freq_index_min])
+                / (freq_index_max - freq_index_min))
 
-            self.data, self.freqs = psd_multitaper(
+    # ------------------------------------------------------------------------
+    def _renderer(self):
+        """Returns the renderer of the topomaps, which interpolates the
+        values of the electrodes with a matrix built once
+        """
+        from backend.topomap import TopomapRenderer
+
+        if self._topomap is None:
+            self._topomap = TopomapRenderer(self.pos, self.head_pos)
+        return self._topomap
+
+    # ------------------------------------------------------------------------
+    def _store_key(self):
+        """Returns the parameters on which the full-band PSD depends"""
+        if self.method == 'multitaper':
+            params = (self.bandwidth, self.dtype)
+        else:
+            params = (self.engine, self.n_fft, self.n_per_seg,
+                      self.n_overlap, self.dtype)
+        targets = (None if self.target_freqs is None
+                   else tuple(self.target_freqs))
+        return (self.method, self.tmin, self.tmax, targets) + params
+
+    # ------------------------------------------------------------------------
+    def _compute(self, epochs, picks):
+        """Computes the PSD of the channels of picks over all the
+        frequencies with the method of the instance
+        """
+        from numpy import inf
+
+        if self.method == 'multitaper':
+            # Same as mne psd_multitaper, with cached tapers
+            from backend.multitaper import psd_epochs_multitaper
+
+            return psd_epochs_multitaper(
                 epochs,
-                fmin=fmin,
-                fmax=fmax,
-                tmin=tmin,
-                tmax=tmax,
-                normalization='full',
+                fmin=0,
+                fmax=inf,
+                tmin=self.tmin,
+                tmax=self.tmax,
                 bandwidth=self.bandwidth,
-                picks=self.picks)
+                picks=picks,
+                dtype=self.dtype,
+                n_jobs=self.n_jobs,
+                target_freqs=self.target_freqs)
+
+        elif self.method == 'welch' and self.engine == 'numpy':
+            from backend.welch import psd_epochs_welch
+
+            return psd_epochs_welch(
+                epochs,
+                fmin=0,
+                fmax=inf,
+                tmin=self.tmin,
+                tmax=self.tmax,
+                n_fft=self.n_fft,
+                n_overlap=self.n_overlap,
+                n_per_seg=self.n_per_seg,
+                picks=picks,
+                dtype=self.dtype,
+                n_jobs=self.n_jobs,
+                target_freqs=self.target_freqs)
 
-        if method == 'welch':
+        elif self.method == 'welch':
             from mne.time_frequency import psd_welch
 
-            self.data, self.freqs = psd_welch(
+            # mne computes in double precision
+            psds, freqs = psd_welch(
                 epochs,
-                fmin=fmin,
-                fmax=fmax,
-                tmin=tmin,
-                tmax=tmax,
+                fmin=0,
+                fmax=inf,
+                tmin=self.tmin,
+                tmax=self.tmax,
                 n_fft=self.n_fft,
                 n_overlap=self.n_overlap,
                 n_per_seg=self.n_per_seg,
-                picks=self.picks)
+                picks=picks,
+                n_jobs=self.n_jobs)
+            return psds.astype(self.dtype, copy=False), freqs
 
     # ------------------------------------------------------------------------
     def __str__(self):
@@ -186,85 +325,83 @@ class EpochsPSD:
 
     # ------------------------------------------------------------------------
     def plot_topomap(self, epoch_index, freq_index,
-                     axes=None, log_display=False):
+                     axes=None, log_display=False, image=None):
         """
         Plot the map of the power for a given frequency chosen by freq_index,
         the frequencyis hence the value self.freqs[freq_index]. This function
         will return an error if the class is not initialized with the
-        coordinates of the different electrodes.
+        coordinates of the different electrodes. If image is a topomap
+        drawn before, only its data is updated.
         """
-        from mne.viz import plot_topomap
-
-        psd_values = self.data[epoch_index, self.with_coord, freq_index]
-        if log_display:
-            psd_values = 10 * log(psd_values)
-        return plot_topomap(psd_values, self.pos, axes=axes,
-                            show=False, cmap=self.cmap,
-                            head_pos=self.head_pos)
+        psd_values = self.display_data(log_display)[
+            epoch_index, self.with_coord, freq_index]
+        return self._renderer().plot(psd_values, axes or plt.gca(),
+                                     cmap=self.cmap, image=image)
 
     # ------------------------------------------------------------------------
     def plot_topomap_band(self, epoch_index, freq_index_min, freq_index_max,
                           axes=None, vmin=None, vmax=None,
-                          log_display=False):
+                          log_display=False, image=None):
         """
         Plot the map of the power for a given frequency band chosen by
         freq_index_min and freq_index_max, the frequency is hence the value
         self.freqs[freq_index]. This function will return an error if the
         class is not initialized with the coordinates of the different
-        electrodes.
+        electrodes. If image is a topomap drawn before, only its data is
+        updated.
         """
-        from mne.viz import plot_topomap
-
-        psd_values = self.data[epoch_index,
-                               self.with_coord,
-                               freq_index_min: freq_index_max]
-        psd_mean = mean(psd_values, axis=1)
+        psd_mean = self.band_mean(freq_index_min, freq_index_max,
+                                  epoch_index)[self.with_coord]
         if log_display:
             psd_mean = 10 * log(psd_mean)
-        return plot_topomap(psd_mean, self.pos, axes=axes,
-                            vmin=vmin, vmax=vmax, show=False,
-                            cmap=self.cmap, head_pos=self.head_pos)
+        return self._renderer().plot(psd_mean, axes or plt.gca(),
+                                     vmin=vmin, vmax=vmax, cmap=self.cmap,
+                                     image=image)
 
     # ------------------------------------------------------------------------
     def plot_avg_topomap_band(self, freq_index_min, freq_index_max,
                               vmin=None, vmax=None, show_names=False,
-                              log_display=False, axes=None):
+                              log_display=False, axes=None, image=None):
         """
         Plot the map of the average power for a given frequency band chosen
         by freq_index_min and freq_index_max, the frequency is hence the value
         self.freqs[freq_index]. This function will return an error if the
         class is not initialized with the coordinates of the different
-        electrodes.
+        electrodes. If image is a topomap drawn before, only its data is
+        updated.
         """
-        from mne.viz import plot_topomap
-
-        psd_values = self.data[:, self.with_coord,
-                               freq_index_min: freq_index_max]
-        psd_mean = mean(psd_values, axis=2)   # average over frequency band
-        psd_mean = mean(psd_mean,   axis=0)   # average over epochs
+        # average over frequency band
+        psd_mean = self.band_mean(freq_index_min,
+                                  freq_index_max)[self.with_coord]
         if log_display:
             psd_mean = 10 * log(psd_mean)
-        return plot_topomap(psd_mean, self.pos, axes=axes,
-                            vmin=vmin, vmax=vmax, show=False,
-                            cmap=self.cmap, head_pos=self.head_pos)
+        return self._renderer().plot(psd_mean, axes or plt.gca(),
+                                     vmin=vmin, vmax=vmax, cmap=self.cmap,
+                                     image=image)
 
     # ------------------------------------------------------------------------
     def plot_avg_matrix(self, freq_index_min, freq_index_max, axes=None,
-                        vmin=None, vmax=None, log_display=False):
+                        vmin=None, vmax=None, log_display=False,
+                        image=None):
         """
         Plot the map of the average power for a given frequency band chosen
         by freq_index_min and freq_index_max, the frequency is hence the value
         self.freqs[freq_index]. This function will return an error if the
         class is not initialized with the coordinates of the different
-        electrodes.
+        electrodes. If image is a matrix drawn before, only its data is
+        updated.
         """
         extent = [
             self.freqs[freq_index_min], self.freqs[freq_index_max],
             self.data.shape[1] + 1,                              1
         ]
-        mat = mean(self.data[:, :, freq_index_min: freq_index_max], axis=0)
-        if log_display:
-            mat = 10 * log(mat)
+        mat = self.display_data(log_display, avg=True)[
+            :, freq_index_min: freq_index_max]
+        if image is not None:
+            from backend.util import _set_image
+
+            image.set_extent(extent)
+            return _set_image(image, mat, vmin, vmax)
         if axes is not None:
             return axes.matshow(mat, extent=extent, cmap=self.cmap,
                                 vmin=vmin, vmax=vmax)
@@ -275,21 +412,26 @@ class EpochsPSD:
     # --------------------------------------------------------------------------
     def plot_matrix(self, epoch_index, freq_index_min, freq_index_max,
                     axes=None, vmin=None, vmax=None,
-                    log_display=False):
+                    log_display=False, image=None):
         """
         Plot the map of the average power for a given frequency band chosen
         by freq_index_min and freq_index_max, the frequency is hence the value
         self.freqs[freq_index]. This function will return an error if the
         class is not initialized with the coordinates of the different
-        electrodes.
+        electrodes. If image is a matrix drawn before, only its data is
+        updated.
         """
         extent = [
             self.freqs[freq_index_min], self.freqs[freq_index_max],
             self.data.shape[1] + 1,                              1
         ]
-        mat = self.data[epoch_index, :, freq_index_min: freq_index_max]
-        if log_display:
-            mat = 10 * log(mat)
+        mat = self.display_data(log_display)[
+            epoch_index, :, freq_index_min: freq_index_max]
+        if image is not None:
+            from backend.util import _set_image
+
+            image.set_extent(extent)
+            return _set_image(image, mat, vmin, vmax)
         if axes is not None:
             return axes.matshow(mat, extent=extent, cmap=self.cmap,
                                 vmin=vmin, vmax=vmax)
@@ -305,9 +447,7 @@ class EpochsPSD:
         between the values corresponding to freq_index_max and
         freq_index_min.
         """
-        psd = self.data[epoch_index, channel_index, :]
-        if log_display:
-            psd = 10 * log(psd)
+        psd = self.display_data(log_display)[epoch_index, channel_index, :]
         if axes is not None:
             return axes.plot(self.freqs, psd, linewidth=2)
         else:
@@ -321,9 +461,7 @@ class EpochsPSD:
         channel_index, between the values corresponding to freq_index_max
         and freq_index_min.
         """
-        psd = mean(self.data[:, channel_index, :], axis=0)
-        if log_display:
-            psd = 10 * log(psd)
+        psd = self.display_data(log_display, avg=True)[channel_index, :]
         if axes is not None:
             return axes.plot(self.freqs, psd, linewidth=2)
         else:
@@ -338,9 +476,8 @@ class EpochsPSD:
         from matplotlib.cm import jet
         from numpy import linspace
 
-        psds = self.data[epoch_index, :, freq_index_min: freq_index_max]
-        if log_display:
-            psds = 10 * log(psds)
+        psds = self.display_data(log_display)[
+            epoch_index, :, freq_index_min: freq_index_max]
         nchan = len(self.picks)
         colors = jet(linspace(0, 1, nchan))
         for i, c in zip(range(nchan), colors):
@@ -359,10 +496,8 @@ class EpochsPSD:
         from matplotlib.cm import jet
         from numpy import linspace
 
-        psds = mean(self.data[:, :, freq_index_min: freq_index_max],
-                    axis=0)
-        if log_display:
-            psds = 10 * log(psds)
+        psds = self.display_data(log_display, avg=True)[
+            :, freq_index_min: freq_index_max]
         nchan = len(self.picks)
         colors = jet(linspace(0, 1, nchan))
         for i, c in zip(range(nchan), colors):
@@ -429,9 +564,7 @@ class EpochsPSD:
                 f.write(struct.pack('x'))
                 n += 1
 
-        data = self.data.astype(np.float32)
-        data = np.reshape(np.mean(data, axis=0),
-                          n_channels * num_freq_frames,
-                          order='F')
+        data = self.avg_data.astype(np.float32)
+        data = np.reshape(data, n_channels * num_freq_frames, order='F')
         data.tofile(f)
         f.close()
@@ -0,0 +1,196 @@
+"""
+This file contains the functions computing the PSD and the wavelets of the
+TFR with the multitaper method, with the same conventions as
+mne.time_frequency.psd_multitaper and mne.time_frequency.tfr_multitaper.
+The DPSS tapers are taken from the process-wide taper cache.
+"""
+
+
+# ---------------------------------------------------------------------
+def dpss_windows(n_times, half_nbw, n_tapers, low_bias=True):
+    """Returns the DPSS tapers and their eigenvalues from the taper cache.
+    With low_bias, only the tapers with an eigenvalue above 0.9 are kept.
+    """
+    from backend.cache import taper_cache
+
+    tapers, eigvals = taper_cache.get(n_times, half_nbw, n_tapers)
+    if low_bias:
+        keep = eigvals > 0.9
+        if not keep.any():
+            keep[0] = True
+        tapers, eigvals = tapers[keep], eigvals[keep]
+    return tapers, eigvals
+
+
+# ---------------------------------------------------------------------
+def _multitaper_freqs(sfreq, n_times, fmin, fmax, target_freqs=None):
+    """Returns the frequencies between fmin and fmax, with the mask of
+    these frequencies in the computed spectrum and the bins to compute,
+    which are None for the whole one-sided spectrum
+    """
+    from numpy import arange
+    from backend.welch import _target_bins
+
+    bins = None
+    if target_freqs is not None:
+        bins = _target_bins(n_times, sfreq, target_freqs)
+        freqs = bins * (float(sfreq) / n_times)
+    else:
+        freqs = arange(n_times // 2 + 1) * (float(sfreq) / n_times)
+    freq_mask = (freqs >= fmin) & (freqs <= fmax)
+    return freqs[freq_mask], freq_mask, bins
+
+
+# ---------------------------------------------------------------------
+def psd_array_multitaper(x, sfreq, fmin=0, fmax=float('inf'),
+                         bandwidth=None, normalization='full',
+                         dtype='float64', target_freqs=None):
+    """
+    Computes the multitaper PSD of the array x along its last axis, with
+    non adaptive weights. Returns the psds of shape x.shape[:-1] +
+    (n_freqs,) and the frequencies. With dtype='float32', the computation
+    is done in single precision. If target_freqs is given, only the
+    frequencies closest to them are computed.
+    """
+    from numpy import arange, asarray, empty, sqrt
+    from scipy.fft import rfft
+    from backend.welch import _dft, _one_sided
+
+    x = asarray(x, dtype=dtype)
+    n_times = x.shape[-1]
+    shape = x.shape[:-1]
+    x = x.reshape(-1, n_times)
+
+    half_nbw = 4. if bandwidth is None else (float(bandwidth) * n_times
+                                             / (2. * sfreq))
+    if half_nbw < 0.5:
+        raise ValueError(('bandwidth value {} yields a normalized bandwidth '
+                          + 'of {} < 0.5, use a value of at least {}')
+                         .format(bandwidth, half_nbw, sfreq / n_times))
+    tapers, eigvals = dpss_windows(n_times, half_nbw, int(2 * half_nbw))
+    tapers = tapers.astype(dtype, copy=False)
+    weights = sqrt(eigvals)[:, None].astype(dtype)
+
+    freqs, freq_mask, bins = _multitaper_freqs(sfreq, n_times, fmin, fmax,
+                                               target_freqs)
+    # DC and Nyquist bins, which are not doubled in the one-sided spectrum
+    half = ~_one_sided(n_times,
+                       arange(n_times // 2 + 1) if bins is None else bins)
+
+    psds = empty((x.shape[0], freq_mask.sum()), dtype=dtype)
+    # Go through the signals by chunks of about 50MB of tapered signals,
+    # which are cast to complex for the DFT, and of spectra
+    n_chunk = max(1, 50000000 // (len(eigvals) * 2 * x.itemsize
+                                  * (n_times + len(freq_mask))))
+    for start in range(0, x.shape[0], n_chunk):
+        sig = x[start:start + n_chunk]
+        sig = sig - sig.mean(axis=-1, keepdims=True)
+        if bins is None:
+            x_mt = rfft(sig[:, None, :] * tapers, n=n_times, axis=-1)
+        else:
+            x_mt = _dft(sig[:, None, :] * tapers, n_times, bins)
+        # Adjust DC and maybe Nyquist, depending on one-sided transform
+        x_mt[..., half] /= sqrt(2.)
+        x_mt = x_mt[..., freq_mask] * weights
+        psd = (x_mt.real ** 2 + x_mt.imag ** 2).sum(axis=-2)
+        psds[start:start + n_chunk] = psd * 2 / (weights ** 2).sum()
+
+    if normalization == 'full':
+        psds /= sfreq
+    return psds.reshape(shape + (-1,)), freqs
+
+
+# ---------------------------------------------------------------------
+def _psd_multitaper_data(x, **kwargs):
+    """Returns the psds of psd_array_multitaper without the frequencies"""
+    return psd_array_multitaper(x, **kwargs)[0]
+
+
+# ---------------------------------------------------------------------
+def psd_epochs_multitaper(epochs, fmin=0, fmax=float('inf'), tmin=None,
+                          tmax=None, bandwidth=None, picks=None,
+                          dtype='float64', n_jobs=1, target_freqs=None):
+    """
+    Computes the multitaper PSD of the epochs, with the channels split
+    across n_jobs processes. Returns the psds of shape
+    (n_epochs, n_channels, n_freqs) and the frequencies. If target_freqs
+    is given, only the frequencies closest to them are computed.
+    """
+    from backend.util import _time_mask, _pick_channels
+    from backend.parallel import parallel_channels
+
+    sfreq = epochs.info['sfreq']
+    if picks is None:
+        picks = list(range(len(epochs.info['ch_names'])))
+    time_mask = _time_mask(epochs.times, tmin, tmax, sfreq)
+    data = _pick_channels(epochs.get_data(), picks)[..., time_mask]
+    psds = parallel_channels(
+        _psd_multitaper_data, data, n_jobs=n_jobs, axis=1, sfreq=sfreq,
+        fmin=fmin, fmax=fmax, bandwidth=bandwidth, dtype=dtype,
+        target_freqs=target_freqs)
+    freqs, _, _ = _multitaper_freqs(sfreq, data.shape[-1], fmin, fmax,
+                                    target_freqs)
+    return psds, freqs
+
+
+# ---------------------------------------------------------------------
+def psd_raw_multitaper(raw, fmin=0, fmax=float('inf'), tmin=None,
+                       tmax=None, bandwidth=None, picks=None,
+                       dtype='float64', n_jobs=1, target_freqs=None):
+    """
+    Computes the multitaper PSD of the raw data, with the channels split
+    across n_jobs processes. Returns the psds of shape
+    (n_channels, n_freqs) and the frequencies. If target_freqs is given,
+    only the frequencies closest to them are computed.
+    """
+    from backend.util import _time_bounds
+    from backend.parallel import parallel_channels
+
+    sfreq = raw.info['sfreq']
+    if picks is None:
+        picks = list(range(len(raw.info['ch_names'])))
+    start, stop = _time_bounds(raw, tmin, tmax)
+    data, _ = raw[picks, start:stop]
+    psds = parallel_channels(
+        _psd_multitaper_data, data, n_jobs=n_jobs, axis=0, sfreq=sfreq,
+        fmin=fmin, fmax=fmax, bandwidth=bandwidth, dtype=dtype,
+        target_freqs=target_freqs)
+    freqs, _, _ = _multitaper_freqs(sfreq, data.shape[-1], fmin, fmax,
+                                    target_freqs)
+    return psds, freqs
+
+
+# ---------------------------------------------------------------------
+def make_dpss_wavelets(sfreq, freqs, n_cycles=7., time_bandwidth=4.):
+    """
+    Returns the multitaper wavelets, as a list over the tapers of lists
+    over the frequencies. The wavelets are centered zero mean oscillations
+    tapered by the cached DPSS windows of the length of each wavelet.
+    """
+    from numpy import arange, atleast_1d, exp, pi, sqrt
+    from numpy.linalg import norm
+
+    if time_bandwidth < 2.0:
+        raise ValueError('time_bandwidth should be >= 2.0 for good '
+                         + 'tapers')
+    n_taps = int(time_bandwidth - 1)
+    n_cycles = atleast_1d(n_cycles)
+    if n_cycles.size != 1 and n_cycles.size != len(freqs):
+        raise ValueError('n_cycles should be fixed or defined for '
+                         + 'each frequency.')
+
+    Ws = [[] for m in range(n_taps)]
+    for k, f in enumerate(freqs):
+        this_n_cycles = n_cycles[k] if n_cycles.size != 1 else n_cycles[0]
+        t_win = this_n_cycles / float(f)
+        t = arange(0., t_win, 1.0 / sfreq)
+        # Making sure wavelets are centered before tapering
+        oscillation = exp(2.0 * 1j * pi * f * (t - t_win / 2.))
+        tapers, _ = dpss_windows(len(t), time_bandwidth / 2., n_taps,
+                                 low_bias=False)
+        for m in range(n_taps):
+            Wk = oscillation * tapers[m]
+            Wk -= Wk.mean()
+            Wk /= sqrt(0.5) * norm(Wk.ravel())
+            Ws[m].append(Wk)
+    return Ws
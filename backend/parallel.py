@@ -0,0 +1,112 @@
+"""
+This file contains the functions splitting a computation over the
+channels across a pool of processes. The input data is copied once in
+shared memory, and every worker reads its channels from it instead of
+receiving a pickled copy. The pools are started once for each number of
+workers and shared by all the computations, so the workers only import
+the modules once.
+"""
+from threading import Lock
+
+# Pools of processes by number of workers
+_pools = {}
+_pool_lock = Lock()
+
+
+# ---------------------------------------------------------------------
+def _split_channels(n_channels, n_jobs):
+    """Returns the lists of channel indices of each job"""
+    from numpy import array_split, arange
+
+    n_jobs = max(1, min(n_jobs, n_channels))
+    return [list(chunk) for chunk in array_split(arange(n_channels), n_jobs)]
+
+
+# ---------------------------------------------------------------------
+def _run_chunk(shm_name, shape, dtype, axis, channels, func, kwargs):
+    """Apply func on the channels of the data stored in shared memory"""
+    from multiprocessing.shared_memory import SharedMemory
+    from numpy import ndarray
+
+    shm = SharedMemory(name=shm_name)
+    try:
+        data = ndarray(shape, dtype=dtype, buffer=shm.buf)
+        return func(data.take(channels, axis=axis), **kwargs)
+    finally:
+        shm.close()
+
+
+# ---------------------------------------------------------------------
+def parallel_channels(func, data, n_jobs=1, axis=0, out_axis=None,
+                      executor=None, **kwargs):
+    """
+    Computes func(data, **kwargs) by splitting the channels of data along
+    axis into n_jobs chunks, processed by a pool of processes. func must be
+    a module level function computing each channel independently. The
+    results are concatenated along out_axis, which is axis by default.
+    The shared pool of process_pool is used, unless an executor is given.
+    """
+    from numpy import concatenate
+
+    out_axis = axis if out_axis is None else out_axis
+    chunks = _split_channels(data.shape[axis], n_jobs or 1)
+    if len(chunks) == 1 and executor is None:
+        return func(data, **kwargs)
+
+    from multiprocessing.shared_memory import SharedMemory
+    from concurrent.futures.process import BrokenProcessPool
+    from numpy import ndarray
+
+    shm = SharedMemory(create=True, size=max(1, data.nbytes))
+    shared = ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)
+    shared[...] = data
+    pool = executor or process_pool(n_jobs)
+    try:
+        futures = [pool.submit(_run_chunk, shm.name, data.shape,
+                               data.dtype.str, axis, channels, func, kwargs)
+                   for channels in chunks]
+        results = [future.result() for future in futures]
+    except BrokenProcessPool:
+        # A worker died, the next computation starts a new pool
+        if executor is None:
+            _drop_pool(pool)
+        raise
+    finally:
+        del shared
+        shm.close()
+        shm.unlink()
+    return concatenate(results, axis=out_axis)
+
+
+# ---------------------------------------------------------------------
+def process_pool(n_jobs):
+    """Returns the pool of n_jobs processes shared by the computations, or
+    None if n_jobs is 1. The pool is started on the first call for each
+    number of workers, and is never shut down while it can be in use by
+    another computation.
+    """
+    if n_jobs is None or n_jobs <= 1:
+        return None
+    with _pool_lock:
+        pool = _pools.get(n_jobs)
+        if pool is None:
+            from multiprocessing import get_context
+            from concurrent.futures import ProcessPoolExecutor
+
+            # Forking is not safe with the threads of the GUI
+            pool = ProcessPoolExecutor(max_workers=n_jobs,
+                                       mp_context=get_context('spawn'))
+            _pools[n_jobs] = pool
+        return pool
+
+
+# ---------------------------------------------------------------------
+def _drop_pool(pool):
+    """Forget the shared pool if it is pool. It is broken, so its other
+    computations fail too.
+    """
+    with _pool_lock:
+        for n_jobs, shared in list(_pools.items()):
+            if shared is pool:
+                del _pools[n_jobs]
+                pool.shutdown(wait=False)
@@ -30,6 +30,15 @@ class RawPSD:
     ============
     __init__                   : Compute all the PSD of each epoch.
 
+    display_data               : Returns the psds, in dB if asked,
+                                  computed once
+
+    band_index                 : Returns the indices of the frequencies of
+                                  a band
+
+    band_mean                  : Returns the psds averaged over a band of
+                                  frequencies, from cumulative sums
+
     plot_topomap               : Plot the map of the power for a given
                                   frequency and epoch.
 
@@ -59,6 +68,24 @@ class RawPSD:
         self.n_fft = kwargs.get('n_fft', 256)
         self.n_per_seg = kwargs.get('n_per_seg', self.n_fft)
         self.n_overlap = kwargs.get('n_overlap', 0)
+        # Welch engine, 'mne' or the batched 'numpy' one
+        self.engine = kwargs.get('engine', 'mne')
+        # Precision in which the PSD is computed and stored
+        self.dtype = kwargs.get('dtype', 'float64')
+        # Frequencies computed instead of the whole spectrum
+        self.target_freqs = kwargs.get('target_freqs', None)
+        # Number of processes across which the channels are split
+        self.n_jobs = kwargs.get('n_jobs', 1)
+        self.chunk_size = kwargs.get('chunk_size', None)
+        if (method == 'welch' and self.engine != 'numpy'
+                and (self.target_freqs is not None
+                     or self.chunk_size is not None)):
+            # Only the engine of the project reads the file by chunks and
+            # computes targeted frequencies
+            print('target_freqs and chunk_size are only handled by the '
+                  + 'numpy engine, which is used instead of '
+                  + '{}'.format(self.engine))
+            self.engine = 'numpy'
         self.cmap = 'jet'
 
         if picks is not None:
@@ -73,140 +100,225 @@ class RawPSD:
                 print(e)
 
         if montage is not None:
-            # First we create variable head_pos for a correct plotting
-            self.pos = montage.get_pos2d()
-            scale = 0.85 / (self.pos.max(axis=0) - self.pos.min(axis=0))
-            center = 0.5 * (self.pos.max(axis=0) + self.pos.min(axis=0))
-            self.head_pos = {'scale': scale, 'center': center}
-
-            # Handling of possible channels without any known coordinates
-            no_coord_channel = False
-            try:
-                names = montage.ch_names
-                indices = [names.index(raw.info['ch_names'][i])
-                           for i in self.picks]
-                self.pos = self.pos[indices, :]
-            except Exception as e:
-                print(e)
-                no_coord_channel = True
-
-            # If there is not as much positions as the number of Channels
-            # we have to eliminate some channels from the data of topomaps
-            if no_coord_channel:
-                from mne.channels import read_montage
-                from numpy import array
-
-                index = 0
-                self.pos = []           # positions
-                # index in the self.data of channels with coordinates
-                self.with_coord = []
-                for i in self.picks:
-                    ch_name = raw.info['ch_names'][i]
-                    try:
-                        ch_montage = read_montage(
-                            montage.kind, ch_names=[ch_name])
-                        coord = ch_montage.get_pos2d()
-                        self.pos.append(coord[0])
-                        self.with_coord.append(index)
-                    except Exception as e:
-                        print(e)
-                        pass
-                    index += 1
-                self.pos = array(self.pos)
-
-            else:
-                self.with_coord = [i for i in range(len(self.picks))]
+            # Positions of the picked channels with known coordinates, the
+            # montage being parsed only once
+            from backend.cache import montage_cache
+
+            ch_names = [raw.info['ch_names'][i] for i in self.picks]
+            self.pos, self.with_coord, self.head_pos = montage_cache.resolve(
+                montage, ch_names)
 
         else:  # If there is no montage available
             self.head_pos = None
             self.with_coord = []
 
-        if method == 'multitaper':
-            from mne.time_frequency import psd_multitaper
+        # Renderer of the topomaps, built on first use
+        self._topomap = None
+
+        # The PSD over all the frequencies is stored channel by channel, and
+        # sliced for further requests with other frequency bounds or picks
+        from backend.cache import spectrum_store
+        from backend.util import _freq_slice
+
+        data, freqs = spectrum_store.get(
+            raw, self._store_key(), self.picks,
+            lambda picks: self._compute(raw, picks))
+        index = _freq_slice(freqs, fmin, fmax)
+        self.data, self.freqs = data[..., index], freqs[index]
+
+    # ------------------------------------------------------------------------
+    @property
+    def data(self):
+        """psds of size (n_channels, n_freqs)"""
+        return self._data
+
+    # ------------------------------------------------------------------------
+    @data.setter
+    def data(self, data):
+        """Set the psds, and invalidate their dB values and sums"""
+        self._data = data
+        self._db_data = None
+        self._cumsum = None
+
+    # ------------------------------------------------------------------------
+    def display_data(self, log_display=False):
+        """Returns the psds, in dB if log_display is True. The dB values are
+        computed once over the whole matrix and shared by all the plots
+        until the data changes.
+        """
+        if not log_display:
+            return self._data
+        if self._db_data is None:
+            self._db_data = 10 * log(self._data)
+            self._db_data.flags.writeable = False
+        return self._db_data
+
+    # ------------------------------------------------------------------------
+    def band_index(self, fmin, fmax):
+        """Returns the indices of the first and last frequencies of the
+        band between fmin and fmax, with a binary search in self.freqs
+        """
+        from backend.util import get_index_freq
+
+        return get_index_freq(self.freqs, fmin, fmax)
+
+    # ------------------------------------------------------------------------
+    def band_mean(self, freq_index_min, freq_index_max):
+        """Returns the psds of each channel averaged over the frequencies
+        between freq_index_min and freq_index_max (excluded). The cumulative
+        sums over frequencies are computed once, so each band costs
+        O(n_channels) whatever its width.
+        """
+        from backend.util import _band_cumsum
+
+        if self._cumsum is None:
+            self._cumsum = _band_cumsum(self._data)
+        return ((self._cumsum[:, freq_index_max]
+                 - self._cumsum[:, freq_index_min])
+                / (freq_index_max - freq_index_min))
 
-            self.data, self.freqs = psd_multitaper(
+    # ------------------------------------------------------------------------
+    def _renderer(self):
+        """Returns the renderer of the topomaps, which interpolates the
+        values of the electrodes with a matrix built once
+        """
+        from backend.topomap import TopomapRenderer
+
+        if self._topomap is None:
+            self._topomap = TopomapRenderer(self.pos, self.head_pos)
+        return self._topomap
+
+    # ------------------------------------------------------------------------
+    def _store_key(self):
+        """Returns the parameters on which the full-band PSD depends"""
+        if self.method == 'multitaper':
+            params = (self.bandwidth, self.dtype)
+        else:
+            # The streamed PSD does not depend on the size of the chunks
+            params = (self.engine, self.n_fft, self.n_per_seg,
+                      self.n_overlap, self.dtype)
+        targets = (None if self.target_freqs is None
+                   else tuple(self.target_freqs))
+        return (self.method, self.tmin, self.tmax, targets) + params
+
+    # ------------------------------------------------------------------------
+    def _compute(self, raw, picks):
+        """Computes the PSD of the channels of picks over all the
+        frequencies with the method of the instance
+        """
+        from numpy import inf
+
+        if self.method == 'multitaper':
+            # Same as mne psd_multitaper, with cached tapers
+            from backend.multitaper import psd_raw_multitaper
+
+            return psd_raw_multitaper(
                 raw,
-                fmin=fmin,
-                fmax=fmax,
-                tmin=tmin,
-                tmax=tmax,
-                normalization='full',
+                fmin=0,
+                fmax=inf,
+                tmin=self.tmin,
+                tmax=self.tmax,
                 bandwidth=self.bandwidth,
-                picks=self.picks)
+                picks=picks,
+                dtype=self.dtype,
+                n_jobs=self.n_jobs,
+                target_freqs=self.target_freqs)
+
+        elif self.method == 'welch' and self.engine == 'numpy':
+            # Read the file by chunks of chunk_size time points, the
+            # segments annotated as bad being left out as in mne
+            from backend.welch import psd_raw_welch_stream
 
-        if method == 'welch':
+            return psd_raw_welch_stream(
+                raw,
+                fmin=0,
+                fmax=inf,
+                tmin=self.tmin,
+                tmax=self.tmax,
+                n_fft=self.n_fft,
+                n_overlap=self.n_overlap,
+                n_per_seg=self.n_per_seg,
+                picks=picks,
+                chunk_size=self.chunk_size,
+                dtype=self.dtype,
+                n_jobs=self.n_jobs,
+                target_freqs=self.target_freqs)
+
+        elif self.method == 'welch':
             from mne.time_frequency import psd_welch
 
-            self.data, self.freqs = psd_welch(
+            # mne computes in double precision
+            psds, freqs = psd_welch(
                 raw,
-                fmin=fmin,
-                fmax=fmax,
-                tmin=tmin,
-                tmax=tmax,
+                fmin=0,
+                fmax=inf,
+                tmin=self.tmin,
+                tmax=self.tmax,
                 n_fft=self.n_fft,
                 n_overlap=self.n_overlap,
                 n_per_seg=self.n_per_seg,
-                picks=self.picks)
+                picks=picks,
+                n_jobs=self.n_jobs)
+            return psds.astype(self.dtype, copy=False), freqs
 
     # --------------------------------------------------------------------------
-    def plot_topomap(self, freq_index, axes=None, log_display=False):
+    def plot_topomap(self, freq_index, axes=None, log_display=False,
+                     image=None):
         """
         Plot the map of the power for a given frequency chosen by freq_index,
         the frequency is hence the value self.freqs[freq_index]. This function
         will return an error if the class is not initialized with the
-        coordinates of the different electrodes.
+        coordinates of the different electrodes. If image is a topomap
+        drawn before, only its data is updated.
         """
-        from mne.viz import plot_topomap
-
-        psd_values = self.data[self.with_coord, freq_index]
-        if log_display:
-            psd_values = 10 * log(psd_values)
-        return plot_topomap(psd_values, self.pos, axes=axes,
-                            show=False, cmap=self.cmap,
-                            head_pos=self.head_pos)
+        psd_values = self.display_data(log_display)[self.with_coord,
+                                                    freq_index]
+        return self._renderer().plot(psd_values, axes or plt.gca(),
+                                     cmap=self.cmap, image=image)
 
     # --------------------------------------------------------------------------
     def plot_topomap_band(self, freq_index_min, freq_index_max,
                           vmin=None, vmax=None,
-                          axes=None, log_display=False):
+                          axes=None, log_display=False, image=None):
         """
         Plot the map of the power for a given frequency band chosen by
         freq_index_min and freq_index_max, the frequency is hence the value
         self.freqs[freq_index]. This function will return an error if the
         class is not initialized with the coordinates of the different
-        electrodes.
+        electrodes. If image is a topomap drawn before, only its data is
+        updated.
         """
-        from mne.viz import plot_topomap
-        from numpy import mean
-
-        psd_mean = mean(self.data[self.with_coord,
-                                  freq_index_min: freq_index_max],
-                        axis=1)
+        psd_mean = self.band_mean(freq_index_min,
+                                  freq_index_max)[self.with_coord]
         if log_display:
             psd_mean = 10 * log(psd_mean)
-        return plot_topomap(psd_mean, self.pos, axes=axes,
-                            vmin=vmin, vmax=vmax,
-                            show=False, cmap=self.cmap,
-                            head_pos=self.head_pos)
+        return self._renderer().plot(psd_mean, axes or plt.gca(),
+                                     vmin=vmin, vmax=vmax, cmap=self.cmap,
+                                     image=image)
 
     # --------------------------------------------------------------------------
     def plot_matrix(self, freq_index_min, freq_index_max,
                     axes=None, vmin=None, vmax=None,
-                    log_display=False):
+                    log_display=False, image=None):
         """
         Plot the map of the average power for a given frequency band chosen
         by freq_index_min and freq_index_max, the frequency is hence the value
         self.freqs[freq_index]. This function will return an error if the
         class is not initialized with the coordinates of the different
-        electrodes.
+        electrodes. If image is a matrix drawn before, only its data is
+        updated.
         """
         extent = [
             self.freqs[freq_index_min], self.freqs[freq_index_max],
             self.data.shape[0] + 1,                              1
         ]
-        mat = self.data[:, freq_index_min: freq_index_max]
-        if log_display:
-            mat = 10 * log(mat)
+        mat = self.display_data(log_display)[
+            :, freq_index_min: freq_index_max]
+        if image is not None:
+            from backend.util import _set_image
+
+            image.set_extent(extent)
+            return _set_image(image, mat, vmin, vmax)
         if axes is not None:
             return axes.matshow(mat, extent=extent, cmap=self.cmap,
                                 vmin=vmin, vmax=vmax)
@@ -221,9 +333,7 @@ class RawPSD:
         Plot a single PSD corresponding channel_index, between the values
         corresponding to freq_index_max and freq_index_min.
         """
-        psd = self.data[channel_index, :]
-        if log_display:
-            psd = 10 * log(psd)
+        psd = self.display_data(log_display)[channel_index, :]
         if axes is not None:
             return axes.plot(self.freqs, psd, linewidth=2)
         else:
@@ -238,9 +348,8 @@ class RawPSD:
         from matplotlib.cm import jet
         from numpy import linspace
 
-        psds = self.data[:, freq_index_min: freq_index_max]
-        if log_display:
-            psds = 10 * log(psds)
+        psds = self.display_data(log_display)[
+            :, freq_index_min: freq_index_max]
         nchan = len(self.picks)
         colors = jet(linspace(0, 1, nchan))
         for i, c in zip(range(nchan), colors):
@@ -0,0 +1,135 @@
+"""
+This file contains the engine computing the averaged Stockwell transform,
+with the same conventions as mne.time_frequency.tfr_array_stockwell. The
+signals of each channel are transformed once, and the frequencies are
+processed by blocks, so only the Stockwell transforms of one block of
+frequencies for one batch of epochs are held in memory. The windows of
+the blocks are computed once for all the channels. The power and the
+phases are accumulated directly in the averaged output.
+"""
+
+
+# ---------------------------------------------------------------------
+def _check_st_nfft(n_times, n_fft):
+    """Returns the length of the transforms, the next power of two by
+    default, as in mne
+    """
+    def is_power_of_two(n):
+        return not (n > 0 and (n & (n - 1)))
+
+    if n_fft is None or (not is_power_of_two(n_fft) and n_times > n_fft):
+        n_fft = 1 << (int(n_times) - 1).bit_length()
+    elif n_fft < n_times:
+        raise ValueError('n_fft cannot be smaller than signal size. '
+                         + 'Got {} < {}.'.format(n_fft, n_times))
+    return int(n_fft)
+
+
+# ---------------------------------------------------------------------
+def _st_freqs(sfreq, n_fft, fmin, fmax):
+    """Returns the indices of the first and last+1 frequencies of the
+    transform between fmin and fmax, and these frequencies
+    """
+    from numpy import absolute
+    from scipy.fft import fftfreq
+
+    freqs = fftfreq(n_fft, 1. / sfreq)
+    if fmin is None:
+        fmin = freqs[freqs > 0][0]
+    if fmax is None:
+        fmax = freqs.max()
+    start_f = int(absolute(freqs - fmin).argmin())
+    stop_f = int(absolute(freqs - fmax).argmin())
+    return start_f, stop_f, freqs[start_f:stop_f]
+
+
+# ---------------------------------------------------------------------
+def _st_windows(n_fft, f_range, sfreq, width, dtype='complex128'):
+    """Returns the Fourier transforms of the gaussian windows of the
+    frequency indices of f_range, of shape (len(f_range), n_fft)
+    """
+    from numpy import empty, exp, ones, pi, r_, sqrt
+    from scipy.fft import fft, fftfreq
+
+    tw = fftfreq(n_fft, 1. / sfreq) / n_fft
+    tw = r_[tw[:1], tw[1:][::-1]]
+    windows = empty((len(f_range), n_fft), dtype=dtype)
+    for i, f in enumerate(f_range):
+        if f == 0.:
+            window = ones(n_fft)
+        else:
+            window = ((f / (sqrt(2. * pi) * width))
+                      * exp(-0.5 * (1. / width ** 2.) * (f ** 2.) * tw ** 2.))
+        window /= window.sum()
+        windows[i] = fft(window)
+    return windows
+
+
+# ---------------------------------------------------------------------
+def tfr_array_stockwell(data, sfreq, fmin=None, fmax=None, n_fft=None,
+                        width=1.0, decim=1, return_itc=False,
+                        block_size=16, batch_size=32, dtype='float64'):
+    """
+    Computes the Stockwell power of data, of shape
+    (n_epochs, n_channels, n_times), averaged over epochs. The frequencies
+    are processed by blocks of block_size and the epochs by batches of
+    batch_size, which bound the memory used. Returns the power of shape
+    (n_channels, n_freqs, n_out), the inter-trial coherence of the same
+    shape (None if return_itc is False) and the frequencies.
+    """
+    from numpy import arange, absolute, concatenate, result_type, zeros
+    from scipy.fft import fft, ifft
+
+    n_epochs, n_channels, n_times = data.shape
+    n_fft = _check_st_nfft(n_times, n_fft)
+    start_f, stop_f, freqs = _st_freqs(sfreq, n_fft, fmin, fmax)
+    cdtype = result_type(dtype, 'complex64')
+
+    n_out = -(-n_times // decim)
+    psd = zeros((n_channels, len(freqs), n_out), dtype=dtype)
+    itc = zeros(psd.shape, dtype=dtype) if return_itc else None
+    shifts = arange(n_fft)
+    # The windows and the indices of the shifted spectra of each block
+    # only depend on the frequencies, so they are shared by the channels
+    blocks = []
+    for block in range(start_f, stop_f, block_size):
+        f_range = arange(block, min(block + block_size, stop_f))
+        windows = _st_windows(n_fft, f_range, sfreq, width, dtype=cdtype)
+        index = f_range[:, None] + shifts
+        out = slice(block - start_f, block - start_f + len(f_range))
+        blocks.append((f_range, windows, index, out))
+
+    for c in range(n_channels):
+        # One transform per epoch, shifted for each frequency
+        X = fft(data[:, c].astype(dtype, copy=False), n_fft, axis=-1)
+        XX = concatenate([X, X], axis=-1)
+        del X
+        for f_range, windows, index, out in blocks:
+            if return_itc:
+                # Sum of the phases over epochs
+                plf = zeros((len(f_range), n_out), dtype=cdtype)
+            for start in range(0, n_epochs, batch_size):
+                st = ifft(XX[start:start + batch_size, index] * windows,
+                          axis=-1)
+                st = st[..., :n_times:decim]
+                st_abs = absolute(st)
+                st_abs[st_abs == 0] = 1.
+                if return_itc:
+                    plf += (st / st_abs).sum(axis=0)
+                st_abs *= st_abs
+                psd[c, out] += st_abs.sum(axis=0)
+            if return_itc:
+                itc[c, out] = absolute(plf) / n_epochs
+    psd /= n_epochs
+    return psd, itc, freqs
+
+
+# ---------------------------------------------------------------------
+def _stockwell_data(data, return_itc=False, **kwargs):
+    """Returns the power of tfr_array_stockwell, stacked on the first
+    axis with the ITC if return_itc is True
+    """
+    from numpy import stack
+
+    psd, itc, _ = tfr_array_stockwell(data, return_itc=return_itc, **kwargs)
+    return stack((psd, itc)) if return_itc else psd
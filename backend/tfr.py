@@ -0,0 +1,404 @@
+"""
+This file contains the engine computing the averaged time-frequency power
+by convolution with banks of wavelets, with the same conventions as
+mne.time_frequency.tfr_morlet and mne.time_frequency.tfr_multitaper,
+and the averaged Stockwell transform of the picked channels, computed by
+backend.stockwell. Each signal is transformed once, and its Fourier
+transform is multiplied by the transforms of all the wavelets of the bank
+at once. Only running sums over the epochs are kept.
+"""
+
+
+class WaveletBank:
+    """
+    This class contains a set of wavelets, one per frequency, with their
+    Fourier transforms. The transforms are computed once for each length
+    of signal, and are shifted so that the convolution with every wavelet
+    is centered on the first time points.
+
+    Attributes:
+    ============
+    Ws          (list)         : complex wavelets, one per frequency
+
+    max_size    (int)          : length of the longest wavelet
+
+    Methods:
+    ============
+    fft                        : Returns the Fourier transforms of the
+                                  wavelets for a given length of signal
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, Ws):
+        self.Ws = Ws
+        self.max_size = max(W.size for W in Ws)
+        self._ffts = {}
+
+    # ------------------------------------------------------------------------
+    def __getstate__(self):
+        """The transforms are left out when the bank is sent to the workers
+        of the pool, which compute them for their own signals
+        """
+        state = self.__dict__.copy()
+        state['_ffts'] = {}
+        return state
+
+    # ------------------------------------------------------------------------
+    def fft(self, n_times, decim=1, dtype='complex128'):
+        """Returns the Fourier transforms of shape (n_freqs, fsize), with
+        fsize the size of the transforms for signals of n_times points.
+        fsize is a multiple of decim, for the decimation in _convolve
+        """
+        from numpy import arange, empty, exp, pi
+        from scipy.fft import fft, next_fast_len
+
+        if self.max_size > n_times:
+            raise ValueError('At least one of the wavelets is longer than '
+                             + 'the signal. Use a longer signal or shorter '
+                             + 'wavelets.')
+        key = (n_times, decim, str(dtype))
+        fft_Ws = self._ffts.get(key)
+        if fft_Ws is None:
+            size = n_times + self.max_size - 1
+            fsize = decim * next_fast_len(-(-size // decim))
+            k = arange(fsize)
+            fft_Ws = empty((len(self.Ws), fsize), dtype=dtype)
+            for i, W in enumerate(self.Ws):
+                # Shift the 'same' part of the convolution to the start
+                start = (W.size - 1) // 2
+                fft_Ws[i] = fft(W, fsize) * exp(2j * pi * k * start / fsize)
+            fft_Ws.flags.writeable = False
+            self._ffts[key] = fft_Ws
+        return fft_Ws
+
+
+# ---------------------------------------------------------------------
+def morlet_bank(sfreq, freqs, n_cycles, zero_mean=True):
+    """Returns the cached bank of Morlet wavelets. They have a zero mean by
+    default, as in mne tfr_morlet.
+    """
+    from numpy import atleast_1d
+    from mne.time_frequency import morlet
+    from backend.cache import wavelet_cache
+
+    def make():
+        Ws = morlet(sfreq, freqs, n_cycles=n_cycles, zero_mean=zero_mean)
+        return [WaveletBank(Ws)]
+
+    key = ('morlet', float(sfreq), tuple(freqs),
+           tuple(atleast_1d(n_cycles)), bool(zero_mean))
+    return wavelet_cache.get(key, make)
+
+
+# ---------------------------------------------------------------------
+def dpss_banks(sfreq, freqs, n_cycles, time_bandwidth):
+    """Returns the cached banks of multitaper wavelets, one per taper"""
+    from numpy import atleast_1d
+    from backend.multitaper import make_dpss_wavelets
+    from backend.cache import wavelet_cache
+
+    def make():
+        Ws = make_dpss_wavelets(sfreq, freqs, n_cycles, time_bandwidth)
+        return [WaveletBank(W) for W in Ws]
+
+    key = ('multitaper', float(sfreq), tuple(freqs),
+           tuple(atleast_1d(n_cycles)), float(time_bandwidth))
+    return wavelet_cache.get(key, make)
+
+
+class PowerAccumulator:
+    """
+    This class accumulates the power of the convolutions of batches of
+    epochs with the wavelets of banks, channel by channel. Only running
+    sums over the epochs are kept, so the memory used does not depend on
+    the number of epochs. The variance of the power over the epochs can be
+    accumulated too, with the Welford algorithm merging the statistics of
+    each batch.
+
+    Attributes:
+    ============
+    n_epochs    (array[int])   : number of epochs added for each channel
+
+    Methods:
+    ============
+    add                        : Add the coefficients of a batch of epochs
+                                  for a channel
+
+    result                     : Returns the averaged power, with the ITC
+                                  and the variance if requested
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, n_channels, n_freqs, n_times, n_banks,
+                 return_itc=False, return_var=False, dtype='float64'):
+        from numpy import result_type, zeros
+
+        shape = (n_channels, n_freqs, n_times)
+        self.n_epochs = zeros(n_channels, dtype=int)
+        self.mean = zeros(shape, dtype=dtype)
+        # Sums of the squared deviations from the mean
+        self.m2 = zeros(shape, dtype=dtype) if return_var else None
+        # Sums of the phases over epochs for each bank
+        self.plf = (zeros((n_channels, n_banks, n_freqs, n_times),
+                          dtype=result_type(dtype, 'complex64'))
+                    if return_itc else None)
+
+    # ------------------------------------------------------------------------
+    def add(self, index, coefs):
+        """Add the coefficients of a batch of epochs for the channel index.
+        coefs is a list over the banks of arrays of shape
+        (n_batch, n_freqs, n_times)
+        """
+        n_a, n_b = int(self.n_epochs[index]), coefs[0].shape[0]
+        power = 0
+        for j, coef in enumerate(coefs):
+            coef_power = coef.real ** 2 + coef.imag ** 2
+            power = power + coef_power
+            if self.plf is not None:
+                magnitude = coef_power ** 0.5
+                # Zero coefficients have no phase, as in mne
+                magnitude[magnitude == 0] = 1.
+                self.plf[index, j] += (coef / magnitude).sum(axis=0)
+        # Power of each epoch, averaged over the banks
+        power /= len(coefs)
+
+        mean_b = power.mean(axis=0)
+        delta = mean_b - self.mean[index]
+        self.mean[index] += delta * (n_b / (n_a + n_b))
+        if self.m2 is not None:
+            power -= mean_b
+            self.m2[index] += ((power ** 2).sum(axis=0)
+                               + delta ** 2 * (n_a * n_b / (n_a + n_b)))
+        self.n_epochs[index] += n_b
+
+    # ------------------------------------------------------------------------
+    def result(self):
+        """Returns the averaged power, followed by the ITC and by the
+        variance over the epochs if they were accumulated
+        """
+        from numpy import absolute, maximum
+
+        n_epochs = self.n_epochs[:, None, None].astype(self.mean.dtype)
+        result = [self.mean]
+        if self.plf is not None:
+            itc = absolute(self.plf).mean(axis=1)
+            itc /= n_epochs
+            result.append(itc)
+        if self.m2 is not None:
+            result.append(self.m2 / maximum(n_epochs - 1, 1))
+        return result[0] if len(result) == 1 else tuple(result)
+
+
+# ---------------------------------------------------------------------
+def _convolve(x, ffts, n_times, decim=1):
+    """Returns the list over banks of the convolutions of the signals x,
+    of shape (n_batch, n_times), with the wavelets of the bank, keeping one
+    time point every decim. The spectra are folded on fsize / decim points
+    before the inverse transform, so the decimated points are never
+    computed.
+    """
+    from scipy.fft import fft, ifft
+
+    fsize = ffts[0].shape[-1]
+    n_out = -(-n_times // decim)
+    # Same precision as the transforms of the wavelets
+    fft_x = fft(x.astype(ffts[0].real.dtype, copy=False), fsize, axis=-1)
+    coefs = []
+    for fft_Ws in ffts:
+        spectrum = fft_x[:, None, :] * fft_Ws
+        if decim > 1:
+            spectrum = spectrum.reshape(spectrum.shape[:-1]
+                                        + (decim, fsize // decim))
+            spectrum = spectrum.sum(axis=-2) / decim
+        coefs.append(ifft(spectrum, axis=-1)[..., :n_out])
+    return coefs
+
+
+# ---------------------------------------------------------------------
+def tfr_power_avg(data, banks, picks, batch_size=32, return_itc=False,
+                  return_var=False, decim=1, dtype='float64'):
+    """
+    Computes the power of the convolution of the signals of data, of shape
+    (n_epochs, n_channels, n_times), with the wavelets of the banks. The
+    power is averaged over epochs and banks. The epochs are processed by
+    batches of batch_size. Returns an array of shape
+    (n_channels, n_freqs, n_times). If return_itc is True, the inter-trial
+    coherence of the same shape is returned too, and if return_var is
+    True, the variance of the power over the epochs. With decim, only one
+    time point every decim is computed. With dtype='float32', the
+    computation is done in single precision.
+    """
+    from numpy import result_type
+
+    n_epochs, _, n_times = data.shape
+    ffts = [bank.fft(n_times, decim, result_type(dtype, 'complex64'))
+            for bank in banks]
+    acc = PowerAccumulator(len(picks), ffts[0].shape[0],
+                           -(-n_times // decim), len(banks),
+                           return_itc=return_itc, return_var=return_var,
+                           dtype=dtype)
+    for i, pick in enumerate(picks):
+        for start in range(0, n_epochs, batch_size):
+            acc.add(i, _convolve(data[start:start + batch_size, pick], ffts,
+                                 n_times, decim))
+    return acc.result()
+
+
+# ---------------------------------------------------------------------
+def tfr_power_stream(epochs, banks, picks, batch_size=32, return_itc=False,
+                     return_var=False, decim=1, dtype='float64'):
+    """
+    Same as tfr_power_avg, but the epochs are read from the file batch by
+    batch, so neither the signals nor the power of all the epochs are held
+    in memory. The memory used depends on batch_size and on the size of
+    the result, not on the number of epochs.
+    """
+    from numpy import result_type
+
+    n_epochs, n_times = len(epochs.events), len(epochs.times)
+    ffts = [bank.fft(n_times, decim, result_type(dtype, 'complex64'))
+            for bank in banks]
+    acc = PowerAccumulator(len(picks), ffts[0].shape[0],
+                           -(-n_times // decim), len(banks),
+                           return_itc=return_itc, return_var=return_var,
+                           dtype=dtype)
+    for start in range(0, n_epochs, batch_size):
+        data = epochs[start:start + batch_size].get_data()
+        for i, pick in enumerate(picks):
+            acc.add(i, _convolve(data[:, pick], ffts, n_times, decim))
+    return acc.result()
+
+
+# ---------------------------------------------------------------------
+def _average_tfr(epochs, picks, power, freqs, method, decim=1):
+    """Returns an AverageTFR from the averaged power"""
+    from mne import pick_info
+    from mne.time_frequency import AverageTFR
+
+    info = pick_info(epochs.info, picks)
+    return AverageTFR(info, power, epochs.times[::decim].copy(), freqs,
+                      nave=len(epochs.events), method=method)
+
+
+# ---------------------------------------------------------------------
+def _tfr_power_data(data, banks, return_itc=False, return_var=False,
+                    decim=1, dtype='float64'):
+    """Computes tfr_power_avg on all the channels of data. With the ITC or
+    the variance, the results are stacked on the first axis
+    """
+    from numpy import stack
+
+    result = tfr_power_avg(data, banks, list(range(data.shape[1])),
+                           return_itc=return_itc, return_var=return_var,
+                           decim=decim, dtype=dtype)
+    return stack(result) if isinstance(result, tuple) else result
+
+
+# ---------------------------------------------------------------------
+def _tfr_avg(epochs, banks, freqs, picks, method, return_itc, n_jobs=1,
+             batch_size=None, return_var=False, decim=1, dtype='float64'):
+    """Returns the AverageTFR of the power, followed by the ones of the ITC
+    if return_itc is True and of the variance if return_var is True. If
+    batch_size is set, the epochs are read from the file batch by batch.
+    Otherwise, the channels can be split across n_jobs processes.
+    """
+    from backend.parallel import parallel_channels
+    from backend.util import _pick_channels
+
+    if picks is None:
+        picks = list(range(len(epochs.info['ch_names'])))
+    stacked = return_itc or return_var
+    if batch_size is not None:
+        result = tfr_power_stream(epochs, banks, picks, batch_size=batch_size,
+                                  return_itc=return_itc, return_var=return_var,
+                                  decim=decim, dtype=dtype)
+    elif n_jobs is not None and n_jobs > 1:
+        result = parallel_channels(
+            _tfr_power_data, _pick_channels(epochs.get_data(), picks),
+            n_jobs=n_jobs,
+            axis=1, out_axis=1 if stacked else 0, banks=banks,
+            return_itc=return_itc, return_var=return_var, decim=decim,
+            dtype=dtype)
+    else:
+        result = tfr_power_avg(epochs.get_data(), banks, picks,
+                               return_itc=return_itc, return_var=return_var,
+                               decim=decim, dtype=dtype)
+    if not stacked:
+        return _average_tfr(epochs, picks, result, freqs, method + '-power',
+                            decim)
+
+    kinds = (['power'] + (['itc'] if return_itc else [])
+             + (['var'] if return_var else []))
+    return tuple(_average_tfr(epochs, picks, values, freqs,
+                              method + '-' + kind, decim)
+                 for values, kind in zip(result, kinds))
+
+
+# ---------------------------------------------------------------------
+def tfr_morlet_avg(epochs, freqs, n_cycles, picks=None, return_itc=False,
+                   n_jobs=1, batch_size=None, return_var=False, decim=1,
+                   dtype='float64'):
+    """
+    Computes the time-frequency power of the epochs with Morlet wavelets,
+    averaged over epochs. Returns an AverageTFR, followed by the
+    AverageTFR of the inter-trial coherence if return_itc is True and of
+    the variance of the power over epochs if return_var is True.
+    """
+    banks = morlet_bank(epochs.info['sfreq'], freqs, n_cycles)
+    return _tfr_avg(epochs, banks, freqs, picks, 'morlet', return_itc,
+                    n_jobs, batch_size=batch_size, return_var=return_var,
+                    decim=decim, dtype=dtype)
+
+
+# ---------------------------------------------------------------------
+def tfr_multitaper_avg(epochs, freqs, n_cycles, time_bandwidth=4.,
+                       picks=None, return_itc=False, n_jobs=1,
+                       batch_size=None, return_var=False, decim=1,
+                       dtype='float64'):
+    """
+    Computes the time-frequency power of the epochs with the multitaper
+    method, averaged over epochs and tapers. Returns an AverageTFR,
+    followed by the AverageTFR of the inter-trial coherence if return_itc
+    is True and of the variance of the power over epochs if return_var is
+    True.
+    """
+    banks = dpss_banks(epochs.info['sfreq'], freqs, n_cycles,
+                       time_bandwidth)
+    return _tfr_avg(epochs, banks, freqs, picks, 'multitaper', return_itc,
+                    n_jobs, batch_size=batch_size, return_var=return_var,
+                    decim=decim, dtype=dtype)
+
+
+# ---------------------------------------------------------------------
+def tfr_stockwell_avg(epochs, fmin=None, fmax=None, n_fft=None, width=1.0,
+                      picks=None, decim=1, return_itc=False, n_jobs=1,
+                      block_size=16, dtype='float64'):
+    """
+    Same as mne.time_frequency.tfr_stockwell, on the channels of picks.
+    The transform is computed on the picked channels of the data, which
+    are a view of the loaded data when possible, or read by batches of
+    epochs, by blocks of block_size frequencies. The channels can be split
+    across n_jobs processes.
+    Returns an AverageTFR, and the AverageTFR of the inter-trial coherence
+    if return_itc is True.
+    """
+    from backend.parallel import parallel_channels
+    from backend.stockwell import _check_st_nfft, _st_freqs, _stockwell_data
+    from backend.util import _picked_epochs_data
+
+    if picks is None:
+        picks = list(range(len(epochs.info['ch_names'])))
+    sfreq = epochs.info['sfreq']
+    data = _picked_epochs_data(epochs, picks)
+    result = parallel_channels(
+        _stockwell_data, data, n_jobs=n_jobs, axis=1,
+        out_axis=1 if return_itc else 0, return_itc=return_itc, sfreq=sfreq,
+        fmin=fmin, fmax=fmax, n_fft=n_fft, width=width, decim=decim,
+        block_size=block_size, dtype=dtype)
+    _, _, freqs = _st_freqs(sfreq, _check_st_nfft(data.shape[-1], n_fft),
+                            fmin, fmax)
+    if return_itc:
+        return (_average_tfr(epochs, picks, result[0], freqs,
+                             'stockwell-power', decim),
+                _average_tfr(epochs, picks, result[1], freqs,
+                             'stockwell-itc', decim))
+    return _average_tfr(epochs, picks, result, freqs, 'stockwell-power',
+                        decim)
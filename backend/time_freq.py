@@ -4,11 +4,16 @@ from app.error import show_error
 # =====================================================================
 
 
+class _ParameterError(ValueError):
+    """Raised when a parameter is invalid, once the error is displayed"""
+
+
 def _init_psd_parameters(self):
     """Set the parameters in the parameters text slot
     """
-    text = 'fmin=0\nfmax=100\ntmin=Default\ntmax=Default\n'
-    if self.ui.psdMethod.currentText() == 'welch':
+    text = ('fmin=0\nfmax=100\ntmin=Default\ntmax=Default\nn_jobs=1\n'
+            + 'dtype=float64\n')
+    if self.ui.psdMethod.currentText().startswith('welch'):
         text = text + 'n_fft=Default\nn_per_seg=Default\nn_overlap=0'
     if self.ui.psdMethod.currentText() == 'multitaper':
         text = text + 'bandwidth=4'
@@ -19,7 +24,7 @@ def _init_psd_parameters(self):
 def _init_tfr_parameters(self):
     """Set the parameters in the parameters text slot
     """
-    text = 'fmin=5\nfmax=100'
+    text = 'fmin=5\nfmax=100\ndecim=1\nitc=False\nn_jobs=1\ndtype=float64'
     if self.ui.tfrMethodBox.currentText() == 'multitaper':
         text = text + '\nfreq_step=1\ntime_window=0.5\ntime_bandwidth=4'
     if self.ui.tfrMethodBox.currentText() == 'morlet':
@@ -31,38 +36,42 @@ def _init_tfr_parameters(self):
 
 # ---------------------------------------------------------------------
 def _save_matrix(self):
-    """Save the matrix containing the PSD
+    """Save the matrix containing the PSD. The saving stops at the first
+    invalid parameter, which is displayed
     """
-    n_files = len(self.filePaths)
-    if n_files == 1:
-        print('Saving one file ...', end='')
-        if self.type == 'epochs':
-            self.init_epochs_psd()
-        if self.type == 'raw':
-            self.init_raw_psd()
-        self.psd.save_avg_matrix_sef(self.savepath)
-        print('done !')
-
-    else:
-        from os.path import basename, splitext, join
-
-        print('Batch Processing of {} files'
-              .format(len(self.filePaths)))
-        n = 0
-        for path in self.filePaths:
-            print('Saving file {} out of {} ...'
-                  .format(n+1, n_files), end='')
-            file_name = splitext(basename(path))[0]
-            self.ui.dataFilesBox.setCurrentIndex(0)
+    try:
+        n_files = len(self.filePaths)
+        if n_files == 1:
+            print('Saving one file ...', end='')
             if self.type == 'epochs':
                 self.init_epochs_psd()
             if self.type == 'raw':
                 self.init_raw_psd()
-
-            savepath = join(self.savepath, file_name + '-PSD.sef')
-            self.psd.save_avg_matrix_sef(savepath)
+            self.psd.save_avg_matrix_sef(self.savepath)
             print('done !')
-            n += 1
+
+        else:
+            from os.path import basename, splitext, join
+
+            print('Batch Processing of {} files'
+                  .format(len(self.filePaths)))
+            n = 0
+            for path in self.filePaths:
+                print('Saving file {} out of {} ...'
+                      .format(n+1, n_files), end='')
+                file_name = splitext(basename(path))[0]
+                self.ui.dataFilesBox.setCurrentIndex(0)
+                if self.type == 'epochs':
+                    self.init_epochs_psd()
+                if self.type == 'raw':
+                    self.init_raw_psd()
+
+                savepath = join(self.savepath, file_name + '-PSD.sef')
+                self.psd.save_avg_matrix_sef(savepath)
+                print('done !')
+                n += 1
+    except _ParameterError as e:
+        print(e)
 
 
 # ---------------------------------------------------------------------
@@ -121,6 +130,51 @@ def _init_nfft(self):
     return n_fft
 
 
+# ---------------------------------------------------------------------
+def _init_njobs(self):
+    """Init the number of processes used for the computation
+    """
+    from backend.util import int_
+
+    n_jobs = int_(self.params.get('n_jobs', None))
+    return 1 if n_jobs is None else n_jobs
+
+
+# ---------------------------------------------------------------------
+def _init_dtype(self):
+    """Init the precision of the computation, float64 or float32
+    """
+    dtype = self.params.get('dtype', None) or 'float64'
+    if dtype not in ('float32', 'float64'):
+        show_error(self, 'dtype must be float32 or float64')
+        raise _ParameterError('Invalid dtype {}'.format(dtype))
+    return dtype
+
+
+# ---------------------------------------------------------------------
+def _init_target_freqs(self):
+    """Init the list of frequencies to compute, separated by commas, or
+    None to compute the whole spectrum
+    """
+    value = self.params.get('target_freqs', None)
+    if value is None:
+        return None
+    try:
+        return [float(freq) for freq in value.split(',') if freq]
+    except ValueError:
+        show_error(self, 'target_freqs must be numbers separated by commas')
+        raise _ParameterError('Invalid target_freqs {}'.format(value))
+
+
+# ---------------------------------------------------------------------
+def _init_welch_engine(self):
+    """Init the engine used for the welch method
+    """
+    if self.ui.psdMethod.currentText() == 'welch (numpy)':
+        return 'numpy'
+    return 'mne'
+
+
 # ---------------------------------------------------------------------
 def _init_epochs_psd(self):
     """Initialize the instance of EpochsPSD
@@ -128,7 +182,7 @@ def _init_epochs_psd(self):
     from backend.epochs_psd import EpochsPSD
     from backend.util import float_, int_
 
-    if self.ui.psdMethod.currentText() == 'welch':
+    if self.ui.psdMethod.currentText().startswith('welch'):
         n_fft = _init_nfft(self)
         self.psd = EpochsPSD(
             self.data,
@@ -140,7 +194,11 @@ def _init_epochs_psd(self):
             n_fft=n_fft,
             n_per_seg=int_(self.params.get('n_per_seg', n_fft)),
             n_overlap=int_(self.params.get('n_overlap', 0)),
+            engine=_init_welch_engine(self),
+            dtype=_init_dtype(self),
+            target_freqs=_init_target_freqs(self),
             picks=_init_picks(self),
+            n_jobs=_init_njobs(self),
             montage=self.montage)
 
     if self.ui.psdMethod.currentText() == 'multitaper':
@@ -152,7 +210,10 @@ def _init_epochs_psd(self):
             tmax=float_(self.params['tmax']),
             method='multitaper',
             bandwidth=float_(self.params.get('bandwidth', 4)),
+            dtype=_init_dtype(self),
+            target_freqs=_init_target_freqs(self),
             picks=_init_picks(self),
+            n_jobs=_init_njobs(self),
             montage=self.montage)
 
 
@@ -163,7 +224,7 @@ def _init_raw_psd(self):
     from backend.raw_psd import RawPSD
     from backend.util import float_, int_
 
-    if self.ui.psdMethod.currentText() == 'welch':
+    if self.ui.psdMethod.currentText().startswith('welch'):
         n_fft = _init_nfft(self)
         self.psd = RawPSD(
             self.data,
@@ -175,7 +236,12 @@ def _init_raw_psd(self):
             n_fft=n_fft,
             n_per_seg=int_(self.params.get('n_per_seg', n_fft)),
             n_overlap=int_(self.params.get('n_overlap', 0)),
+            engine=_init_welch_engine(self),
+            dtype=_init_dtype(self),
+            target_freqs=_init_target_freqs(self),
+            chunk_size=int_(self.params.get('chunk_size', None)),
             picks=_init_picks(self),
+            n_jobs=_init_njobs(self),
             montage=self.montage)
 
     if self.ui.psdMethod.currentText() == 'multitaper':
@@ -187,7 +253,10 @@ def _init_raw_psd(self):
             tmax=float_(self.params['tmax']),
             method='multitaper',
             bandwidth=float_(self.params.get('bandwidth', 4)),
+            dtype=_init_dtype(self),
+            target_freqs=_init_target_freqs(self),
             picks=_init_picks(self),
+            n_jobs=_init_njobs(self),
             montage=self.montage)
 
 
@@ -197,7 +266,11 @@ def _open_epochs_psd_visualizer(self):
     """
     from app.epochs_psd import EpochsPSDWindow
 
-    _init_epochs_psd(self)
+    try:
+        _init_epochs_psd(self)
+    except _ParameterError as e:
+        print(e)
+        return
     psdVisualizer = EpochsPSDWindow(self.psd, parent=self)
     psdVisualizer.show()
 
@@ -208,7 +281,11 @@ def _open_raw_psd_visualizer(self):
     """
     from app.raw_psd import RawPSDWindow
 
-    _init_raw_psd(self)
+    try:
+        _init_raw_psd(self)
+    except _ParameterError as e:
+        print(e)
+        return
     psdVisualizer = RawPSDWindow(self.psd, parent=self)
     psdVisualizer.show()
 
@@ -219,13 +296,9 @@ def _init_avg_tfr(self):
     """Init tfr from parameters
     """
     from backend.avg_epochs_tfr import AvgEpochsTFR
-    from backend.util import float_, int_
-    from numpy import arange
+    from backend.util import float_, int_, bool_
 
-    fmin = float_(self.params['fmin'])
-    fmax = float_(self.params['fmax'])
-    step = float_(self.params.get('freq_step', 1))
-    freqs = arange(fmin, fmax, step)
+    freqs = _init_freqs(self)
     n_cycles = _init_ncycles(self, freqs)
     n_fft = int_(self.params.get('n_fft', None))
 
@@ -237,7 +310,62 @@ def _init_avg_tfr(self):
         time_bandwidth=float_(self.params.get('time_bandwidth', 4)),
         width=float_(self.params.get('width', 1)),
         n_fft=n_fft,
-        picks=picks)
+        picks=picks,
+        itc=bool_(self.params.get('itc', None)),
+        n_jobs=_init_njobs(self),
+        decim=_init_decim(self),
+        batch_size=int_(self.params.get('batch_size', None)),
+        variance=bool_(self.params.get('variance', None)),
+        dtype=_init_dtype(self),
+        block_size=_init_block_size(self),
+        montage=self.montage)
+
+
+# ---------------------------------------------------------------------
+def _init_decim(self):
+    """Init the decimation factor of the TFR
+    """
+    from backend.util import int_
+
+    decim = int_(self.params.get('decim', None))
+    return 1 if decim is None else decim
+
+
+# ---------------------------------------------------------------------
+def _init_block_size(self):
+    """Init the number of frequencies transformed at once by stockwell
+    """
+    from backend.util import int_
+
+    block_size = int_(self.params.get('block_size', None))
+    return 16 if block_size is None else block_size
+
+
+# ---------------------------------------------------------------------
+def _init_freqs(self):
+    """Init the frequencies of the TFR. They can be given explicitly,
+    separated by commas, or spaced between fmin and fmax either linearly
+    with freq_step, or logarithmically with n_freqs frequencies
+    """
+    from backend.util import float_, int_
+    from numpy import arange, array, geomspace
+
+    freqs = self.params.get('freqs', None)
+    if freqs is not None:
+        return array(sorted(float(freq) for freq in freqs.split(',')
+                            if freq))
+    fmin = float_(self.params['fmin'])
+    fmax = float_(self.params['fmax'])
+    if self.params.get('freq_scale', None) == 'log':
+        if fmin is None or fmin <= 0:
+            show_error(self, 'fmin must be positive with freq_scale=log')
+            raise _ParameterError('Invalid fmin {}'.format(fmin))
+        n_freqs = int_(self.params.get('n_freqs', None))
+        # fmax is excluded, as with the linear spacing
+        return geomspace(fmin, fmax, 30 if n_freqs is None else n_freqs,
+                         endpoint=False)
+    step = float_(self.params.get('freq_step', 1))
+    return arange(fmin, fmax, step)
 
 
 # ---------------------------------------------------------------------
@@ -275,6 +403,9 @@ def _open_tfr_visualizer(self):
         print('Please initialize the EEG data before'
               + ' proceeding.')
 
+    except _ParameterError as e:
+        print(e)
+
     except ValueError:
         print('Time-Window or n_cycles is too high for'
               + 'the length of the signal.\n'
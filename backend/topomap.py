@@ -0,0 +1,161 @@
+"""
+This file contains the renderer of the topomaps of the PSD. It draws the
+same map as mne.viz.plot_topomap (Clough-Tocher interpolation of the
+values of the electrodes, clipped to the head), but the interpolation
+only depends on the positions, so it is built once as a matrix and each
+new map is a single matrix-vector product drawn in the existing image.
+"""
+
+
+# ---------------------------------------------------------------------
+def _head_outlines(radius=0.5):
+    """Returns the lines of the head, the nose and the ears, as in mne"""
+    from numpy import array, cos, linspace, pi, sin
+
+    angles = linspace(0, 2 * pi, 101)
+    nose_x = array([0.18, 0, -0.18]) * radius
+    nose_y = array([radius - .004, radius * 1.15, radius - .004])
+    ear_x = array([.497, .510, .518, .5299, .5419, .54, .547, .532, .510,
+                   .489])
+    ear_y = array([.0555, .0775, .0783, .0746, .0555, -.0055, -.0932,
+                   -.1313, -.1384, -.1199])
+    return [(cos(angles) * radius, sin(angles) * radius),
+            (nose_x, nose_y), (ear_x, ear_y), (-ear_x, ear_y)]
+
+
+# ---------------------------------------------------------------------
+def _setup_vmin_vmax(values, vmin, vmax):
+    """Returns the color limits used by mne when none is given"""
+    from numpy import absolute
+
+    if vmin is None and vmax is None:
+        vmax = absolute(values).max()
+        vmin = 0. if values.min() >= 0 else -vmax
+    return vmin, vmax
+
+
+class TopomapRenderer:
+    """
+    This class draws the topomaps of the values of a set of electrodes.
+    The positions are scaled with head_pos and shrunk into the head as in
+    mne, and the interpolation matrix from the electrodes to the grid of
+    the image is computed once for each resolution.
+
+    Attributes:
+    ============
+    pos         (numpy arr.)   : scaled positions of the electrodes
+
+    radius      (float)        : radius of the head
+
+    Methods:
+    ============
+    interpolate                : Returns the interpolated image of values
+
+    plot                       : Draw the topomap of values, or update an
+                                  existing one
+
+    plot_head                  : Draw the electrodes and the head
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, pos, head_pos=None, radius=0.5):
+        from numpy import array, hypot
+
+        pos = array(pos, dtype=float)[:, :2]
+        if head_pos is None:
+            center = 0.5 * (pos.max(axis=0) + pos.min(axis=0))
+            pos -= center
+            pos *= 0.85 / (pos.max(axis=0) - pos.min(axis=0))
+        else:
+            pos -= head_pos['center']
+            pos *= head_pos['scale']
+        # Shrink the positions until all of them are in the head
+        while (hypot(pos[:, 0], pos[:, 1]) > radius).any():
+            pos *= 0.99
+        self.pos = pos
+        self.radius = radius
+        self._operators = {}
+
+    # ------------------------------------------------------------------------
+    def _operator(self, res):
+        """Returns the matrix of shape (res * res, n_channels) giving the
+        image from the values of the electrodes. The Clough-Tocher
+        interpolation is linear in the values, so the matrix is obtained
+        by interpolating the identity once.
+        """
+        operator = self._operators.get(res)
+        if operator is None:
+            from itertools import product
+            from numpy import (array, concatenate, eye, linspace, meshgrid,
+                               nan_to_num, zeros)
+            from scipy.interpolate import CloughTocher2DInterpolator
+            from scipy.spatial import Delaunay
+
+            # Points with zero values outside the electrodes, as in mne
+            extremes = array([self.pos.min(axis=0), self.pos.max(axis=0)])
+            diffs = extremes[1] - extremes[0]
+            extremes[0] -= diffs
+            extremes[1] += diffs
+            outer = array([[extremes[i, 0], extremes[j, 1]]
+                           for i, j in product((0, 1), repeat=2)])
+            points = concatenate((self.pos, outer))
+
+            n_channels = len(self.pos)
+            values = concatenate((eye(n_channels),
+                                  zeros((len(outer), n_channels))))
+            interp = CloughTocher2DInterpolator(Delaunay(points), values)
+            grid = linspace(-self.radius, self.radius, res)
+            xi, yi = meshgrid(grid, grid)
+            operator = nan_to_num(interp(xi, yi)).reshape(-1, n_channels)
+            operator.flags.writeable = False
+            self._operators[res] = operator
+        return operator
+
+    # ------------------------------------------------------------------------
+    def interpolate(self, values, res=64):
+        """Returns the image of shape (res, res) interpolated from the
+        values of the electrodes
+        """
+        from numpy import asarray
+
+        values = asarray(values, dtype=float)
+        return (self._operator(res) @ values).reshape(res, res)
+
+    # ------------------------------------------------------------------------
+    def plot(self, values, axes, vmin=None, vmax=None, cmap='jet', res=64,
+             image=None):
+        """
+        Draw the topomap of values in axes and returns the image. If image
+        is a topomap drawn before by this renderer, only its data and its
+        color limits are updated.
+        """
+        from numpy import asarray
+
+        values = asarray(values, dtype=float)
+        vmin, vmax = _setup_vmin_vmax(values, vmin, vmax)
+        data = self.interpolate(values, res)
+        if image is not None:
+            image.set_data(data)
+            image.set_clim(vmin, vmax)
+            return image
+
+        from matplotlib.patches import Ellipse
+
+        r = self.radius
+        image = axes.imshow(data, cmap=cmap, vmin=vmin, vmax=vmax,
+                            origin='lower', aspect='equal',
+                            extent=(-r, r, -r, r), interpolation='bilinear')
+        image.set_clip_path(Ellipse((0, 0), 2 * r, 2 * r,
+                                    transform=axes.transData))
+        self.plot_head(axes)
+        return image
+
+    # ------------------------------------------------------------------------
+    def plot_head(self, axes):
+        """Draw the electrodes with the outlines of the head in axes"""
+        r = self.radius
+        axes.plot(self.pos[:, 0], self.pos[:, 1], 'k.', markersize=2)
+        for x, y in _head_outlines(r):
+            axes.plot(x, y, color='k', linewidth=1)
+        axes.set_xlim(-r * 1.15, r * 1.15)
+        axes.set_ylim(-r * 1.15, r * 1.25)
+        axes.set_axis_off()
@@ -15,6 +15,24 @@ def eeg_to_montage(eeg):
         return None
 
 
+# ---------------------------------------------------------------------
+def read_eeg(path, preload=False):
+    """Read a fif file and returns its type ('raw' or 'epochs') with the
+    data. With preload=False only the header is read when the file is
+    opened, and the samples are read from the file when they are used.
+    The epochs PSD and the TFR still read all the epochs at once. preload
+    can also be a path to a file used to memory-map the data.
+    """
+    if path.endswith('-epo.fif'):
+        from mne import read_epochs
+        return 'epochs', read_epochs(path, preload=preload)
+    elif path.endswith('.fif'):
+        from mne.io import read_raw_fif
+        return 'raw', read_raw_fif(path, preload=preload)
+    else:
+        raise TypeError("Type not handled")
+
+
 # ---------------------------------------------------------------------
 def float_(value):
     """float with handle of none values
@@ -35,27 +53,56 @@ def int_(value):
         return int(value)
 
 
+# --------------------------------------------------------------------
+def bool_(value):
+    """bool from the text of a parameter, with handle of none values
+    """
+    if value is None:
+        return None
+    else:
+        return value.lower() in ('true', '1', 'yes')
+
+
+# ---------------------------------------------------------------------
+def get_info_summary(eeg_data):
+    """Returns a dict with the sampling frequency, the number of channels,
+    the number of time points, the duration and the number of epochs of
+    the data. Everything is read from the header, so the samples are
+    never loaded. For raw data, the number of epochs is None.
+    """
+    from mne.io import BaseRaw
+
+    sfreq = eeg_data.info['sfreq']
+    summary = {'sfreq': sfreq, 'n_channels': eeg_data.info['nchan']}
+    if isinstance(eeg_data, BaseRaw):
+        summary['n_times'] = eeg_data.n_times
+        summary['duration'] = eeg_data.n_times / sfreq
+        summary['n_epochs'] = None
+    else:
+        times = eeg_data.times
+        summary['n_times'] = len(times)
+        summary['duration'] = times[-1] - times[0]
+        summary['n_epochs'] = len(eeg_data.events)
+    return summary
+
+
 # ---------------------------------------------------------------------
 def init_info_string(eeg_data):
     """Init a string with informations about data
     """
-    sfreq = eeg_data.info['sfreq']
-    n_channels = eeg_data.info['nchan']
+    summary = get_info_summary(eeg_data)
     infos1 = (('<li><b>Sampling Frequency:</b> {}Hz'
                + '<li><b>Number of Channels:</b> {}')
-              .format(sfreq, n_channels))
-    if len(eeg_data.get_data().shape) == 2:
-        n_times = eeg_data.n_times
-        infos2 = '<li><b>Time points:</b> {}</li>'.format(n_times)
-        infos3 = ('<li><b>Duration of the signal:</b> {0:.2f}s </li>'
-                  .format((n_times / sfreq)))
-
+              .format(summary['sfreq'], summary['n_channels']))
+    if summary['n_epochs'] is None:
+        infos2 = ('<li><b>Time points:</b> {}</li>'
+                  .format(summary['n_times']))
     else:
-        times = eeg_data.times
-        infos2 = ('<li><b>Time points per Epoch:</b> {} </li>'
-                  .format(len(times)))
-        infos3 = ('<li><b>Duration of the signal:</b> {0:.2f}s </li>'
-                  .format(times[-1] - times[0]))
+        infos2 = (('<li><b>Number of Epochs:</b> {}</li>'
+                   + '<li><b>Time points per Epoch:</b> {} </li>')
+                  .format(summary['n_epochs'], summary['n_times']))
+    infos3 = ('<li><b>Duration of the signal:</b> {0:.2f}s </li>'
+              .format(summary['duration']))
 
     infos = infos1 + infos2 + infos3
     return '<ul>' + infos + '</ul>'
@@ -63,14 +110,13 @@ def init_info_string(eeg_data):
 
 # ---------------------------------------------------------------------
 def get_index_freq(freqs, fmin, fmax):
-    """Get the indices of the freq between fmin and fmax in freqs
+    """Get the indices of the freq between fmin and fmax in the sorted
+    freqs, with a binary search
     """
-    f_index_min, f_index_max = -1, 0
-    for freq in freqs:
-        if freq <= fmin:
-            f_index_min += 1
-        if freq <= fmax:
-            f_index_max += 1
+    from numpy import searchsorted
+
+    f_index_min = int(searchsorted(freqs, fmin, side='right')) - 1
+    f_index_max = int(searchsorted(freqs, fmax, side='right'))
 
     # Just check if f_index_max is not out of bound
     f_index_max = min(len(freqs) - 1, f_index_max)
@@ -78,6 +124,113 @@ def get_index_freq(freqs, fmin, fmax):
     return f_index_min, f_index_max
 
 
+# ---------------------------------------------------------------------
+def _band_cumsum(data):
+    """Returns the cumulative sums of data along its last axis, starting
+    with zero, in double precision, read-only. The sum of any band
+    data[..., a:b] is then cumsum[..., b] - cumsum[..., a].
+    """
+    from numpy import cumsum, zeros
+
+    out = zeros(data.shape[:-1] + (data.shape[-1] + 1,))
+    cumsum(data, axis=-1, out=out[..., 1:])
+    out.flags.writeable = False
+    return out
+
+
+# ---------------------------------------------------------------------
+def _time_mask(times, tmin, tmax, sfreq):
+    """Returns the mask of the times between tmin and tmax, rounded to
+    the closest samples
+    """
+    tmin = times[0] if tmin is None else tmin
+    tmax = times[-1] if tmax is None else tmax
+    tmin = int(round(tmin * sfreq)) / sfreq - 0.5 / sfreq
+    tmax = int(round(tmax * sfreq)) / sfreq + 0.5 / sfreq
+    return (times >= tmin) & (times <= tmax)
+
+
+# ---------------------------------------------------------------------
+def _time_bounds(raw, tmin, tmax):
+    """Returns the first and last+1 samples between tmin and tmax"""
+    sfreq = raw.info['sfreq']
+    start = 0 if tmin is None else max(0, int(round(tmin * sfreq)))
+    stop = raw.n_times
+    if tmax is not None:
+        stop = min(stop, int(round(tmax * sfreq)) + 1)
+    return start, stop
+
+
+# ---------------------------------------------------------------------
+def _axis_edges(values):
+    """Returns the edges of the cells centered on the sorted values, with
+    the scale of the values: 'uniform' if they are evenly spaced, 'log' if
+    they are log-spaced (the edges are then geometric means), or 'linear'
+    """
+    from numpy import allclose, asarray, concatenate, diff, exp, log
+
+    values = asarray(values, dtype=float)
+    steps = diff(values)
+    if len(values) < 3 or allclose(steps, steps[0]):
+        scale, work = 'uniform', values
+    elif values[0] > 0 and allclose(diff(log(values)),
+                                    log(values[1] / values[0])):
+        scale, work = 'log', log(values)
+    else:
+        scale, work = 'linear', values
+
+    if len(work) == 1:
+        edges = work[0] + asarray([-0.5, 0.5])
+    else:
+        middles = (work[1:] + work[:-1]) / 2
+        edges = concatenate(([2 * work[0] - middles[0]], middles,
+                             [2 * work[-1] - middles[-1]]))
+    return (exp(edges) if scale == 'log' else edges), scale
+
+
+# ---------------------------------------------------------------------
+def _pick_channels(data, picks, axis=1):
+    """Returns the channels of picks of data along axis. If the picks are
+    evenly spaced and increasing, as a range of channels, a view of data is
+    returned. Otherwise only the picked channels are copied.
+    """
+    picks = [int(pick) for pick in picks]
+    steps = set(b - a for a, b in zip(picks[:-1], picks[1:]))
+    if picks and (not steps or (len(steps) == 1 and min(steps) > 0)):
+        step = steps.pop() if steps else 1
+        index = slice(picks[0], picks[-1] + 1, step)
+        return data[(slice(None),) * axis + (index,)]
+    return data.take(picks, axis=axis)
+
+
+# ---------------------------------------------------------------------
+def _picked_epochs_data(epochs, picks, batch_size=32):
+    """Returns the data of the channels of picks of the epochs. If the
+    samples are not loaded, the epochs are read by batches of batch_size,
+    so only the picked channels of all the epochs are held in memory.
+    """
+    from numpy import concatenate
+
+    if epochs.preload:
+        return _pick_channels(epochs.get_data(), picks)
+    return concatenate([
+        epochs[start:start + batch_size].get_data().take(picks, axis=1)
+        for start in range(0, len(epochs.events), batch_size)])
+
+
+# ---------------------------------------------------------------------
+def _freq_slice(freqs, fmin, fmax):
+    """Returns the slice of the sorted freqs between fmin and fmax, both
+    included, so that the data can be sliced without copy
+    """
+    from numpy import searchsorted
+
+    start = 0 if fmin is None else searchsorted(freqs, fmin, side='left')
+    stop = (len(freqs) if fmax is None
+            else searchsorted(freqs, fmax, side='right'))
+    return slice(int(start), int(stop))
+
+
 # --------------------------------------------------------------------
 def _annot(win, click, annot):
     """Set the annotation on click
@@ -88,3 +241,24 @@ def _annot(win, click, annot):
                 click.mouseevent.ydata)
     annot.set_visible(True)
     win.ui.canvas.draw_idle()
+
+
+# ---------------------------------------------------------------------
+def _set_image(image, data, vmin=None, vmax=None):
+    """Replace the data of an image (or of a mesh drawn with pcolormesh)
+    drawn before, with the color limits vmin and vmax. A limit which is
+    None is set to the extremum of the finite values, as when the image is
+    created.
+    """
+    from numpy.ma import masked_invalid
+
+    if vmin is None or vmax is None:
+        finite = masked_invalid(data)
+        vmin = finite.min() if vmin is None else vmin
+        vmax = finite.max() if vmax is None else vmax
+    if hasattr(image, 'set_data'):
+        image.set_data(data)
+    else:
+        image.set_array(data.ravel())
+    image.set_clim(vmin, vmax)
+    return image
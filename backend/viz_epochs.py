@@ -13,33 +13,55 @@ win --> instance of EpochsPSDWindow
 
 # ---------------------------------------------------------------------
 def _plot_topomaps(win):
-    """Plot the topomaps
+    """Plot the topomaps. If only the epoch, the band or the color limits
+    changed, the displayed topomaps are updated in place
     """
+    from backend.viz_util import _reuse_frame, _keep_frame
+
+    key = ('Topomap',) + _layout(win)
+    if _reuse_frame(win, key, _update_topomaps):
+        return
     gs = win.ui.figure.add_gridspec(10, 30)
-    _topomaps_adjust(win, gs)
+    artists = _topomaps_adjust(win, gs)
     _add_colorbar(win, gs)
-    win.ui.canvas.draw()
+    _keep_frame(win, key, artists)
 
 
 # ---------------------------------------------------------------------
 def _plot_matrix(win):
-    """Plot the Matrix
+    """Plot the Matrix. If only the epoch, the band or the color limits
+    changed, the displayed matrices are updated in place
     """
+    from backend.viz_util import _reuse_frame, _keep_frame
+
+    key = ('Matrix',) + _layout(win)
+    if _reuse_frame(win, key, _update_matrix):
+        return
     gs = win.ui.figure.add_gridspec(10, 30)
-    _matrix_adjust(win, gs)
+    artists = _matrix_adjust(win, gs)
     _add_colorbar(win, gs)
-    win.ui.canvas.draw()
+    _keep_frame(win, key, artists)
 
 
 # ---------------------------------------------------------------------
 def _plot_all_psd(win):
     """Plot all the PSD
     """
+    from backend.viz_util import _drop_frame
+
+    _drop_frame(win)
     gs = win.ui.figure.add_gridspec(10, 30)
     _plot_all_psd_adjust(win, gs)
     win.ui.canvas.draw()
 
 
+# ---------------------------------------------------------------------
+def _layout(win):
+    """Returns what the displayed axes and colorbar depend on"""
+    return (bool(win.ui.showSingleEpoch.checkState()),
+            bool(win.ui.showMean.checkState()), bool(win.log))
+
+
 # ---------------------------------------------------------------------
 def _add_colorbar(win, gs):
     """Add colorbar to the plot at correct position
@@ -60,9 +82,11 @@ def _add_colorbar(win, gs):
 # Adjusting the plots
 # =====================================================================
 def _topomaps_adjust(win, gs):
-    """Plot the good number of subplots and update cbar_image instance
+    """Plot the good number of subplots and update cbar_image instance.
+    Returns the artists changing with the epoch and the band.
     """
     win.ui.figure.clear()
+    artists = {}
     both = (win.ui.showMean.checkState()
             and win.ui.showSingleEpoch.checkState())
 
@@ -70,32 +94,55 @@ def _topomaps_adjust(win, gs):
     if win.ui.showSingleEpoch.checkState():
         slice = gs[:, :12] if both else gs[:, 0:25]
         ax = win.ui.figure.add_subplot(slice)
-        win.cbar_image, _ = win.psd.plot_topomap_band(
+        win.cbar_image = win.psd.plot_topomap_band(
                                 win.epoch_index,
                                 win.f_index_min, win.f_index_max,
                                 axes=ax, vmin=win.vmin, vmax=win.vmax,
                                 log_display=win.log)
 
-        ax.set_title('Epoch {}'.format(win.epoch_index + 1),
-                     fontsize=15, fontweight='light')
+        artists['single'] = win.cbar_image
+        artists['single_title'] = ax.set_title(
+            'Epoch {}'.format(win.epoch_index + 1),
+            fontsize=15, fontweight='light')
 
     # plot average data if showMean is checked
     if win.ui.showMean.checkState():
         slice = gs[:, 13:25] if both else gs[:, :25]
         ax = win.ui.figure.add_subplot(slice)
-        win.cbar_image, _ = win.psd.plot_avg_topomap_band(
+        win.cbar_image = win.psd.plot_avg_topomap_band(
                                 win.f_index_min, win.f_index_max, axes=ax,
                                 vmin=win.vmin, vmax=win.vmax,
                                 log_display=win.log)
 
+        artists['avg'] = win.cbar_image
         ax.set_title('Average', fontsize=15, fontweight='light')
+    return artists
+
+
+# ---------------------------------------------------------------------
+def _update_topomaps(win, artists):
+    """Update the topomaps drawn by _topomaps_adjust"""
+    if 'single' in artists:
+        win.psd.plot_topomap_band(
+            win.epoch_index, win.f_index_min, win.f_index_max,
+            axes=artists['single'].axes, vmin=win.vmin, vmax=win.vmax,
+            log_display=win.log, image=artists['single'])
+        artists['single_title'].set_text(
+            'Epoch {}'.format(win.epoch_index + 1))
+    if 'avg' in artists:
+        win.psd.plot_avg_topomap_band(
+            win.f_index_min, win.f_index_max, axes=artists['avg'].axes,
+            vmin=win.vmin, vmax=win.vmax, log_display=win.log,
+            image=artists['avg'])
 
 
 # ---------------------------------------------------------------------
 def _matrix_adjust(win, gs):
-    """Plot the matrix and update cbar_image instance
+    """Plot the matrix and update cbar_image instance. Returns the artists
+    changing with the epoch and the band.
     """
     win.ui.figure.clear()
+    artists = {}
     both = (win.ui.showMean.checkState()
             and win.ui.showSingleEpoch.checkState())
 
@@ -109,8 +156,10 @@ def _matrix_adjust(win, gs):
                               vmin=win.vmin, vmax=win.vmax,
                               axes=ax, log_display=win.log)
         ax.axis('tight')
-        ax.set_title('Matrix for epoch {}'.format(win.epoch_index + 1),
-                     fontsize=15, fontweight='light')
+        artists['single'] = win.cbar_image
+        artists['single_title'] = ax.set_title(
+            'Matrix for epoch {}'.format(win.epoch_index + 1),
+            fontsize=15, fontweight='light')
         ax.set_xlabel('Frequencies (Hz)')
         ax.set_ylabel('Channels')
         ax.xaxis.set_ticks_position('bottom')
@@ -125,12 +174,31 @@ def _matrix_adjust(win, gs):
                               vmin=win.vmin, vmax=win.vmax,
                               log_display=win.log)
         ax.axis('tight')
+        artists['avg'] = win.cbar_image
         ax.set_title('Average Matrix', fontsize=15,
                      fontweight='light')
         ax.set_xlabel('Frequencies (Hz)')
         ax.set_ylabel('Channels')
         ax.xaxis.set_ticks_position('bottom')
         ax.grid(False)
+    return artists
+
+
+# ---------------------------------------------------------------------
+def _update_matrix(win, artists):
+    """Update the matrices drawn by _matrix_adjust"""
+    if 'single' in artists:
+        win.psd.plot_matrix(
+            win.epoch_index, win.f_index_min, win.f_index_max,
+            vmin=win.vmin, vmax=win.vmax, axes=artists['single'].axes,
+            log_display=win.log, image=artists['single'])
+        artists['single_title'].set_text(
+            'Matrix for epoch {}'.format(win.epoch_index + 1))
+    if 'avg' in artists:
+        win.psd.plot_avg_matrix(
+            win.f_index_min, win.f_index_max, axes=artists['avg'].axes,
+            vmin=win.vmin, vmax=win.vmax, log_display=win.log,
+            image=artists['avg'])
 
 
 # ---------------------------------------------------------------------
@@ -13,12 +13,18 @@ win --> instance of RawPSDWindow
 
 # ----------------------------------------------------------------------
 def _plot_topomap(win):
-    """Plot the topomaps
+    """Plot the topomaps. If only the band or the color limits changed,
+    the displayed topomap is updated in place
     """
+    from backend.viz_util import _reuse_frame, _keep_frame
+
+    key = ('Topomap', bool(win.log))
+    if _reuse_frame(win, key, _update_topomap):
+        return
     win.ui.figure.clear()
     gs = win.ui.figure.add_gridspec(10, 30)
     ax = win.ui.figure.add_subplot(gs[:, :25])
-    win.cbar_image, _ = win.psd.plot_topomap_band(
+    win.cbar_image = win.psd.plot_topomap_band(
                              win.f_index_min, win.f_index_max, axes=ax,
                              vmin=win.vmin, vmax=win.vmax,
                              log_display=win.log)
@@ -32,13 +38,28 @@ def _plot_topomap(win):
 
     win.ui.figure.subplots_adjust(top=0.9, right=0.8,
                                   left=0.1, bottom=0.1)
-    win.ui.canvas.draw()
+    _keep_frame(win, key, {'image': win.cbar_image})
+
+
+# ---------------------------------------------------------------------
+def _update_topomap(win, artists):
+    """Update the topomap drawn by _plot_topomap"""
+    win.psd.plot_topomap_band(
+        win.f_index_min, win.f_index_max, axes=artists['image'].axes,
+        vmin=win.vmin, vmax=win.vmax, log_display=win.log,
+        image=artists['image'])
 
 
 # ---------------------------------------------------------------------
 def _plot_matrix(win):
-    """Plot the Matrix
+    """Plot the Matrix. If only the band or the color limits changed, the
+    displayed matrix is updated in place
     """
+    from backend.viz_util import _reuse_frame, _keep_frame
+
+    key = ('Matrix', bool(win.log))
+    if _reuse_frame(win, key, _update_matrix):
+        return
     win.ui.figure.clear()
     gs = win.ui.figure.add_gridspec(10, 30)
     ax = win.ui.figure.add_subplot(gs[:, :25])
@@ -59,13 +80,25 @@ def _plot_matrix(win):
     else:
         label = 'Power (µV²/Hz)'
     cbar.ax.set_xlabel(label, labelpad=15)
-    win.ui.canvas.draw()
+    _keep_frame(win, key, {'image': win.cbar_image})
+
+
+# ---------------------------------------------------------------------
+def _update_matrix(win, artists):
+    """Update the matrix drawn by _plot_matrix"""
+    win.psd.plot_matrix(
+        win.f_index_min, win.f_index_max, axes=artists['image'].axes,
+        vmin=win.vmin, vmax=win.vmax, log_display=win.log,
+        image=artists['image'])
 
 
 # ---------------------------------------------------------------------
 def _plot_all_psd(win):
     """Plot all PSDs
     """
+    from backend.viz_util import _drop_frame
+
+    _drop_frame(win)
     win.ui.figure.clear()
     gs = win.ui.figure.add_gridspec(10, 30)
     ax = win.ui.figure.add_subplot(gs[:, :30])
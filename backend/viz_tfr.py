@@ -6,70 +6,130 @@ import matplotlib.pyplot as plt
 
 # ---------------------------------------------------------------------
 def _plot_time_freq(self):
-    """Plot the time-frequency representation
+    """Plot the time-frequency representation. If only the channel or the
+    color limits changed, the displayed plot is updated in place
     """
-    from backend.viz_util import _plot_legend_topomap
+    from backend.viz_util import (_plot_legend_topomap, _reuse_frame,
+                                  _keep_frame)
+
+    key = ('Time-Frequency', bool(self.log), bool(self.itc))
+    if _reuse_frame(self, key, _update_time_freq):
+        return
     self.ui.figure.clear()
     gs = self.ui.figure.add_gridspec(10, 30)
     ax = self.ui.figure.add_subplot(gs[:, :25])
     self.cbar_image = self.avg.plot_time_freq(
-        self.index, ax, vmin=self.vmin, vmax=self.vmax, log_display=self.log)
-    ax.set_title('Time-Frequency Plot - Channel {}'.format(
-                 self.avg.info['ch_names'][self.avg.picks[self.index]]),
-                 fontsize=15, fontweight='light')
+        self.index, ax, vmin=self.vmin, vmax=self.vmax, log_display=self.log,
+        itc=self.itc)
+    title = ax.set_title(
+        'Time-Frequency Plot - Channel {}'.format(
+            self.avg.info['ch_names'][self.avg.picks[self.index]]),
+        fontsize=15, fontweight='light')
     ax.set_xlabel('Time (s)')
     ax.set_ylabel('Frequencies (Hz)')
     ax.grid(False)
     cax = self.ui.figure.add_subplot(gs[2:, 27])
     cbar = plt.colorbar(self.cbar_image, cax=cax, format='%6.1e')
-    cbar.ax.set_xlabel('Power', labelpad=15)
+    cbar.ax.set_xlabel('ITC' if self.itc else 'Power', labelpad=15)
+    artists = {'image': self.cbar_image, 'title': title}
     if self.avg.with_coord != []:
         tax = cax = self.ui.figure.add_subplot(gs[:2, 25:30])
-        _plot_legend_topomap(self, tax, self.index + 1)
+        artists['marker'] = _plot_legend_topomap(self, tax, self.index + 1)
 
-    self.ui.canvas.draw()
+    _keep_frame(self, key, artists)
+
+
+# ---------------------------------------------------------------------
+def _update_time_freq(self, artists):
+    """Update the plot drawn by _plot_time_freq"""
+    from backend.viz_util import _set_legend_marker
+
+    image = artists['image']
+    self.avg.plot_time_freq(
+        self.index, image.axes, vmin=self.vmin, vmax=self.vmax,
+        log_display=self.log, itc=self.itc, image=image)
+    artists['title'].set_text('Time-Frequency Plot - Channel {}'.format(
+        self.avg.info['ch_names'][self.avg.picks[self.index]]))
+    if 'marker' in artists:
+        _set_legend_marker(self, artists['marker'], self.index + 1)
 
 
 # ---------------------------------------------------------------------
 def _plot_freq_ch(self):
-    """Plot the frequency-channel representation
+    """Plot the frequency-channel representation. If only the time or the
+    color limits changed, the displayed plot is updated in place
     """
+    from backend.viz_util import _reuse_frame, _keep_frame
+
+    key = ('Frequency-Channel', bool(self.log), bool(self.itc))
+    if _reuse_frame(self, key, _update_freq_ch):
+        return
     self.ui.figure.clear()
     gs = self.ui.figure.add_gridspec(10, 30)
     ax = self.ui.figure.add_subplot(gs[:, :25])
     self.cbar_image = self.avg.plot_freq_ch(
-        self.index, ax, vmin=self.vmin, vmax=self.vmax, log_display=self.log)
-    ax.set_title(('Frequency-Channel Plot - Time {:.2f}s'
-                 .format(self.avg.tfr.times[self.index])),
-                 fontsize=15, fontweight='light')
+        self.index, ax, vmin=self.vmin, vmax=self.vmax, log_display=self.log,
+        itc=self.itc)
+    title = ax.set_title(('Frequency-Channel Plot - Time {:.2f}s'
+                          .format(self.avg.tfr.times[self.index])),
+                         fontsize=15, fontweight='light')
     ax.set_xlabel('Frequencies (Hz)')
     ax.set_ylabel('Channels')
     ax.grid(False)
     cax = self.ui.figure.add_subplot(gs[:, 27])
     cbar = plt.colorbar(self.cbar_image, cax=cax, format='%6.1e')
-    cbar.ax.set_xlabel('Power', labelpad=15)
-    self.ui.canvas.draw()
+    cbar.ax.set_xlabel('ITC' if self.itc else 'Power', labelpad=15)
+    _keep_frame(self, key, {'image': self.cbar_image, 'title': title})
+
+
+# ---------------------------------------------------------------------
+def _update_freq_ch(self, artists):
+    """Update the plot drawn by _plot_freq_ch"""
+    image = artists['image']
+    self.avg.plot_freq_ch(
+        self.index, image.axes, vmin=self.vmin, vmax=self.vmax,
+        log_display=self.log, itc=self.itc, image=image)
+    artists['title'].set_text('Frequency-Channel Plot - Time {:.2f}s'
+                              .format(self.avg.tfr.times[self.index]))
 
 
 # ---------------------------------------------------------------------
 def _plot_time_ch(self):
-    """Plot the time-channels representation
+    """Plot the time-channels representation. If only the frequency or the
+    color limits changed, the displayed plot is updated in place
     """
+    from backend.viz_util import _reuse_frame, _keep_frame
+
+    key = ('Time-Channel', bool(self.log), bool(self.itc))
+    if _reuse_frame(self, key, _update_time_ch):
+        return
     self.ui.figure.clear()
     gs = self.ui.figure.add_gridspec(10, 30)
     ax = self.ui.figure.add_subplot(gs[:, :25])
     self.cbar_image = self.avg.plot_time_ch(
-        self.index, ax, vmin=self.vmin, vmax=self.vmax, log_display=self.log)
-    ax.set_title(('Time-Channel Plot - Frequency {:.2f}'
-                  .format(self.avg.tfr.freqs[self.index])),
-                 fontsize=15, fontweight='light')
+        self.index, ax, vmin=self.vmin, vmax=self.vmax, log_display=self.log,
+        itc=self.itc)
+    title = ax.set_title(('Time-Channel Plot - Frequency {:.2f}'
+                          .format(self.avg.tfr.freqs[self.index])),
+                         fontsize=15, fontweight='light')
     ax.set_xlabel('Time (s)')
     ax.set_ylabel('Channels')
     ax.grid(False)
     cax = self.ui.figure.add_subplot(gs[:, 27])
     cbar = plt.colorbar(self.cbar_image, cax=cax, format='%6.1e')
-    cbar.ax.set_xlabel('Power', labelpad=15)
-    self.ui.canvas.draw()
+    cbar.ax.set_xlabel('ITC' if self.itc else 'Power', labelpad=15)
+    _keep_frame(self, key, {'image': self.cbar_image, 'title': title})
+
+
+# ---------------------------------------------------------------------
+def _update_time_ch(self, artists):
+    """Update the plot drawn by _plot_time_ch"""
+    image = artists['image']
+    self.avg.plot_time_ch(
+        self.index, image.axes, vmin=self.vmin, vmax=self.vmax,
+        log_display=self.log, itc=self.itc, image=image)
+    artists['title'].set_text('Time-Channel Plot - Frequency {:.2f}'
+                              .format(self.avg.tfr.freqs[self.index]))
 
 
 # ---------------------------------------------------------------------
@@ -77,11 +137,14 @@ def _plot_topomap_tfr(self):
     """Plot topomap for TFR window
     """
     from matplotlib.ticker import FormatStrFormatter
+    from backend.viz_util import _drop_frame
 
+    _drop_frame(self)
     try:
         self.ui.figure.clear()
         ax = self.ui.figure.add_subplot(1, 1, 1)
-        fig = self.avg.tfr.plot_topomap(
+        tfr = self.avg.itc if self.itc else self.avg.tfr
+        fig = tfr.plot_topomap(
             tmin=self.tmin, tmax=self.tmax,
             fmin=self.fmin, fmax=self.fmax,
             vmin=self.vmin, vmax=self.vmax,
@@ -91,7 +154,7 @@ def _plot_topomap_tfr(self):
         ax = fig.get_axes()[1]
         ax.yaxis.set_major_formatter(FormatStrFormatter('%6.1e'))
         ax.tick_params(axis='both', labelsize=10)
-        ax.set_xlabel('Power', fontsize=10)
+        ax.set_xlabel('ITC' if self.itc else 'Power', fontsize=10)
         ax.get_xaxis().labelpad = 15
         self.ui.canvas.draw()
 
@@ -26,28 +26,38 @@ def _prepare_single_psd_plot(win):
 
 # ---------------------------------------------------------------------
 def _plot_legend_topomap(win, ax, channel_picked):
-    """Plot the little topomap legend for the PSD plot
+    """Plot the little topomap legend for the PSD plot, and returns the
+    marker of the picked channel
     """
-    from mne.viz import plot_topomap
-    import numpy as np
-    from matplotlib.colors import ListedColormap
+    try:
+        obj = win.psd
+    except AttributeError:
+        obj = win.avg
+
+    obj._renderer().plot_head(ax)
+    marker, = ax.plot([], [], marker='.', markersize=18, color='black',
+                      linestyle='')
+    _set_legend_marker(win, marker, channel_picked)
+    return marker
 
-    white = np.array([[0, 0, 0, 0]])
-    cmp = ListedColormap(white)
 
+# ---------------------------------------------------------------------
+def _set_legend_marker(win, marker, channel_picked):
+    """Move the marker of the topomap legend to the picked channel, it is
+    hidden if the channel has no coordinates
+    """
     try:
         obj = win.psd
     except AttributeError:
         obj = win.avg
 
-    zeros = [0 for i in range(len(obj.pos))]
-    mask = np.array([False for i in range(len(obj.pos))])
-    mask[obj.with_coord.index(channel_picked - 1)] = True
-
-    plot_topomap(zeros, obj.pos, axes=ax, cmap=cmp, mask=mask, show=False,
-                 mask_params=dict(marker='.', markersize=18,
-                                  markerfacecolor='black',
-                                  markeredgecolor='black'))
+    if (channel_picked - 1) in obj.with_coord:
+        index = obj.with_coord.index(channel_picked - 1)
+        x, y = obj._renderer().pos[index]
+        marker.set_data([x], [y])
+        marker.set_visible(True)
+    else:
+        marker.set_visible(False)
 
 
 # ---------------------------------------------------------------------
@@ -60,3 +70,87 @@ def _set_psd_window(win, fig):
     win.resize(1400, 1000)
     win.findChild(QStatusBar).hide()
     fig.show()
+
+
+# Persistent artists
+# =====================================================================
+def _reuse_frame(win, key, update):
+    """If the last plot of win was drawn with the same layout key and is
+    still displayed, update its artists in place with update(win, artists)
+    and redraw them, then returns True. Otherwise returns False, and the
+    plot has to be drawn again.
+    """
+    frame = getattr(win, '_frame', None)
+    if frame is None or frame['key'] != key or not _frame_displayed(win):
+        return False
+
+    scales = _scales(frame['artists'])
+    update(win, frame['artists'])
+    if _scales(frame['artists']) != scales or frame['background'] is None:
+        # The colorbars and the axes change with the color limits and the
+        # extents of the images
+        win.ui.canvas.draw_idle()
+    else:
+        canvas = win.ui.canvas
+        canvas.restore_region(frame['background'])
+        for artist in frame['artists'].values():
+            win.ui.figure.draw_artist(artist)
+        canvas.blit(win.ui.figure.bbox)
+        canvas.flush_events()
+    return True
+
+
+# ---------------------------------------------------------------------
+def _keep_frame(win, key, artists):
+    """Keep the artists of the plot just drawn, to be updated by the next
+    frames with the same layout key, and draw the canvas. The artists are
+    animated: they are drawn over the background saved after each full
+    draw, so updating them only blits the figure.
+    """
+    for artist in artists.values():
+        artist.set_animated(True)
+    win._frame = {'key': key, 'artists': artists,
+                  'axes': list(win.ui.figure.axes), 'background': None}
+    if getattr(win, '_frame_cid', None) is None:
+        win._frame_cid = win.ui.canvas.mpl_connect(
+            'draw_event', lambda event: _save_background(win))
+    win.ui.canvas.draw()
+
+
+# ---------------------------------------------------------------------
+def _drop_frame(win):
+    """Forget the artists of the last plot, before a plot drawn entirely
+    at each update
+    """
+    win._frame = None
+
+
+# ---------------------------------------------------------------------
+def _frame_displayed(win):
+    """Returns True if the axes of the kept artists are still in the
+    figure
+    """
+    axes = win.ui.figure.axes
+    return all(ax in axes for ax in win._frame['axes'])
+
+
+# ---------------------------------------------------------------------
+def _save_background(win):
+    """Save the background of the figure after a full draw, and draw the
+    animated artists over it
+    """
+    frame = getattr(win, '_frame', None)
+    if frame is None or not _frame_displayed(win):
+        return
+    frame['background'] = win.ui.canvas.copy_from_bbox(win.ui.figure.bbox)
+    for artist in frame['artists'].values():
+        win.ui.figure.draw_artist(artist)
+
+
+# ---------------------------------------------------------------------
+def _scales(artists):
+    """Returns the color limits and the extents of the images among
+    artists
+    """
+    return [(artist.get_clim(), getattr(artist, 'get_extent', list)())
+            for artist in artists.values() if hasattr(artist, 'get_clim')]
@@ -0,0 +1,252 @@
+"""
+This file contains the functions computing the PSD with the Welch method,
+with the same conventions as mne.time_frequency.psd_welch: hamming
+windows, removal of the mean of each segment, one-sided density
+scaling and average of the periodograms over the segments.
+"""
+
+
+# ---------------------------------------------------------------------
+def _check_nfft(n, n_fft, n_per_seg, n_overlap):
+    """Check and adapt the welch parameters to the length n of the signal
+    """
+    n_per_seg = n_fft if n_per_seg is None or n_per_seg > n_fft else n_per_seg
+    n_per_seg = n if n_per_seg > n else n_per_seg
+    if n_overlap is None:
+        n_overlap = 0
+    if n_fft > n:
+        raise ValueError(('If n_per_seg is None n_fft is not allowed to be '
+                          + '> n_times. If you want zero-padding, you have '
+                          + 'to set n_per_seg to relevant length. Got n_fft '
+                          + 'of {} while signal length is {}.')
+                         .format(n_fft, n))
+    if n_overlap >= n_per_seg:
+        raise ValueError(('n_overlap cannot be greater than n_per_seg '
+                          + '(or n_fft). Got n_overlap of {} while '
+                          + 'n_per_seg is {}.').format(n_overlap, n_per_seg))
+    return n_fft, n_per_seg, n_overlap
+
+
+# ---------------------------------------------------------------------
+def _welch_freqs(sfreq, n_fft, fmin, fmax, target_freqs=None):
+    """Returns the frequencies between fmin and fmax, with the mask of
+    these frequencies in the computed spectrum and the bins to compute,
+    which are None for the whole one-sided spectrum
+    """
+    from numpy import arange
+
+    bins = None
+    if target_freqs is not None:
+        bins = _target_bins(n_fft, sfreq, target_freqs)
+        freqs = bins * (float(sfreq) / n_fft)
+    else:
+        freqs = arange(n_fft // 2 + 1) * (float(sfreq) / n_fft)
+    freq_mask = (freqs >= fmin) & (freqs <= fmax)
+    return freqs[freq_mask], freq_mask, bins
+
+
+# ---------------------------------------------------------------------
+def _target_bins(n_fft, sfreq, target_freqs):
+    """Returns the sorted indices of the bins of the one-sided spectrum of
+    n_fft points closest to the target frequencies
+    """
+    from numpy import asarray, clip, rint, unique
+
+    bins = rint(asarray(target_freqs, dtype=float) * n_fft / sfreq)
+    return unique(clip(bins.astype(int), 0, n_fft // 2))
+
+
+# ---------------------------------------------------------------------
+def _dft(x, n_fft, bins):
+    """Returns the DFT of n_fft points of x along its last axis, only at
+    the frequency bins, as the product with the DFT basis. This gives the
+    same values as the Goertzel algorithm, and costs
+    O(x.shape[-1] * len(bins)) per signal instead of a whole FFT.
+    """
+    from numpy import arange, exp, outer, pi, result_type
+
+    basis = exp(-2j * pi * outer(arange(x.shape[-1]), bins) / n_fft)
+    return x @ basis.astype(result_type(x.dtype, 'complex64'), copy=False)
+
+
+# ---------------------------------------------------------------------
+def _one_sided(n_fft, bins):
+    """Returns the mask of the bins which are doubled in the one-sided
+    spectrum: all of them but the DC and Nyquist ones
+    """
+    return (bins != 0) & ~((n_fft % 2 == 0) & (bins == n_fft // 2))
+
+
+# ---------------------------------------------------------------------
+def _welch_sum(x, sfreq, n_fft, n_per_seg, n_overlap, dtype='float64',
+               bins=None):
+    """Returns the sum of the periodograms of all the segments of x along
+    its last axis, with the number of segments of each signal. All the
+    segments of all the signals are windowed through a single strided view
+    of x, and transformed with one batched real FFT. Segments containing
+    NaN, as the parts of the raw data rejected by annotation, are left out
+    of the sum and of the count, as with the nanmean of mne. With
+    dtype='float32', the computation is done in single precision. If bins
+    is given, only these bins of the spectrum are computed, with _dft.
+    """
+    from numpy import arange, asarray, isnan
+    from numpy.lib.stride_tricks import as_strided
+    from scipy.fft import rfft
+    from scipy.signal import get_window
+
+    x = asarray(x, dtype=dtype)
+    step = n_per_seg - n_overlap
+    n_segments = (x.shape[-1] - n_overlap) // step
+    segments = as_strided(
+        x, shape=x.shape[:-1] + (n_segments, n_per_seg),
+        strides=x.strides[:-1] + (x.strides[-1] * step, x.strides[-1]),
+        writeable=False)
+
+    window = get_window('hamming', n_per_seg).astype(dtype)
+    segments = segments - segments.mean(axis=-1, keepdims=True)
+    segments *= window
+    if bins is None:
+        bins = arange(n_fft // 2 + 1)
+        spectrum = rfft(segments, n=n_fft, axis=-1)
+    else:
+        spectrum = _dft(segments, n_fft, bins)
+    del segments
+    psds = spectrum.real ** 2
+    psds += spectrum.imag ** 2
+    del spectrum
+    # Segments with NaN have NaN periodograms
+    valid = ~isnan(psds[..., 0])
+    n_valid = valid.sum(axis=-1)
+    if not valid.all():
+        psds[~valid] = 0
+    psds = psds.sum(axis=-2)
+
+    # One-sided density scaling
+    psds *= 1. / (sfreq * (window ** 2).sum())
+    psds[..., _one_sided(n_fft, bins)] *= 2
+    return psds, n_valid
+
+
+# ---------------------------------------------------------------------
+def psd_array_welch(x, sfreq, fmin=0, fmax=float('inf'), n_fft=256,
+                    n_overlap=0, n_per_seg=None, dtype='float64',
+                    target_freqs=None):
+    """
+    Computes the Welch PSD of the array x along its last axis, in a single
+    batch. Returns the psds of shape x.shape[:-1] + (n_freqs,) and the
+    frequencies. If target_freqs is given, only the frequencies of the
+    spectrum closest to them are computed.
+    """
+    n_fft, n_per_seg, n_overlap = _check_nfft(
+        x.shape[-1], n_fft, n_per_seg, n_overlap)
+    freqs, freq_mask, bins = _welch_freqs(sfreq, n_fft, fmin, fmax,
+                                          target_freqs)
+    psds, n_segments = _welch_sum(x, sfreq, n_fft, n_per_seg, n_overlap,
+                                  dtype=dtype, bins=bins)
+    psds = psds[..., freq_mask]
+    psds /= n_segments[..., None]
+    return psds, freqs
+
+
+# ---------------------------------------------------------------------
+def _psd_welch_data(x, **kwargs):
+    """Returns the psds of psd_array_welch without the frequencies"""
+    return psd_array_welch(x, **kwargs)[0]
+
+
+# ---------------------------------------------------------------------
+def _welch_sum_data(x, **kwargs):
+    """Returns the sum of the periodograms of _welch_sum, with the number
+    of segments of each signal appended as the last frequency
+    """
+    from numpy import concatenate
+
+    psds, n_segments = _welch_sum(x, **kwargs)
+    return concatenate((psds, n_segments[..., None].astype(psds.dtype)),
+                       axis=-1)
+
+
+# ---------------------------------------------------------------------
+def psd_epochs_welch(epochs, fmin=0, fmax=float('inf'), tmin=None,
+                     tmax=None, n_fft=256, n_overlap=0, n_per_seg=None,
+                     picks=None, dtype='float64', n_jobs=1,
+                     target_freqs=None):
+    """
+    Computes the Welch PSD of all the epochs and channels at once, or
+    with the channels split across n_jobs processes. Returns the psds of
+    shape (n_epochs, n_channels, n_freqs) and the frequencies. If
+    target_freqs is given, only the frequencies closest to them are
+    computed.
+    """
+    from backend.util import _time_mask, _pick_channels
+    from backend.parallel import parallel_channels
+
+    sfreq = epochs.info['sfreq']
+    if picks is None:
+        picks = list(range(len(epochs.info['ch_names'])))
+    time_mask = _time_mask(epochs.times, tmin, tmax, sfreq)
+    data = _pick_channels(epochs.get_data(), picks)[..., time_mask]
+    psds = parallel_channels(
+        _psd_welch_data, data, n_jobs=n_jobs, axis=1, sfreq=sfreq,
+        fmin=fmin, fmax=fmax, n_fft=n_fft, n_overlap=n_overlap,
+        n_per_seg=n_per_seg, dtype=dtype, target_freqs=target_freqs)
+    freqs, _, _ = _welch_freqs(sfreq, n_fft, fmin, fmax, target_freqs)
+    return psds, freqs
+
+
+# ---------------------------------------------------------------------
+def psd_raw_welch_stream(raw, fmin=0, fmax=float('inf'),
+                         tmin=None, tmax=None, n_fft=256, n_overlap=0,
+                         n_per_seg=None, picks=None, chunk_size=1000000,
+                         dtype='float64', n_jobs=1, target_freqs=None):
+    """
+    Computes the Welch PSD of raw by reading the file chunk by chunk.
+    Each chunk contains a whole number of segments of the signal, so the
+    periodograms are the same as with the whole signal, and their sum is
+    accumulated from one chunk to the other. The memory used depends on
+    chunk_size (number of time points per chunk), not on the length of
+    the recording. If chunk_size is None, the signal is read at once.
+    The channels of each chunk can be split across n_jobs processes.
+    As in mne psd_welch, the parts of the signal annotated as bad are read
+    as NaN, and the segments overlapping them are left out of the average.
+    If target_freqs is given, only the frequencies closest to them are
+    computed. Returns the psds of shape (n_channels, n_freqs) and the
+    frequencies.
+    """
+    from numpy import zeros
+    from backend.util import _time_bounds
+    from backend.parallel import parallel_channels
+
+    if picks is None:
+        picks = list(range(len(raw.info['ch_names'])))
+    sfreq = raw.info['sfreq']
+    start, stop = _time_bounds(raw, tmin, tmax)
+    n_fft, n_per_seg, n_overlap = _check_nfft(
+        stop - start, n_fft, n_per_seg, n_overlap)
+    freqs, freq_mask, bins = _welch_freqs(sfreq, n_fft, fmin, fmax,
+                                          target_freqs)
+
+    step = n_per_seg - n_overlap
+    n_segments = (stop - start - n_overlap) // step
+    if chunk_size is None:
+        seg_per_chunk = n_segments
+    else:
+        seg_per_chunk = max(1, (chunk_size - n_overlap) // step)
+
+    psds = zeros((len(picks), freq_mask.sum()), dtype=dtype)
+    counts = zeros(len(picks), dtype=int)
+    for first in range(0, n_segments, seg_per_chunk):
+        n_seg = min(seg_per_chunk, n_segments - first)
+        chunk_start = start + first * step
+        chunk_stop = chunk_start + (n_seg - 1) * step + n_per_seg
+        data = raw.get_data(picks, chunk_start, chunk_stop,
+                            reject_by_annotation='NaN')
+        result = parallel_channels(
+            _welch_sum_data, data, n_jobs=n_jobs, sfreq=sfreq, n_fft=n_fft,
+            n_per_seg=n_per_seg, n_overlap=n_overlap, dtype=dtype,
+            bins=bins)
+        psds += result[:, :-1][:, freq_mask]
+        counts += result[:, -1].astype(int)
+
+    psds /= counts[:, None]
+    return psds, freqs
@@ -1,15 +1,18 @@
 import sys
 import os
-from PyQt5.QtWidgets import QDialog, QApplication
-from PyQt5.QtGui import QIcon
-from app.time_freq import TimeFreq
 
-import matplotlib.pyplot as plt
-plt.style.use('fivethirtyeight')
+# The workers of the process pool import this module again under another
+# name, so the GUI is only imported when the application is run
+if __name__ == '__main__':
+    from PyQt5.QtWidgets import QDialog, QApplication
+    from PyQt5.QtGui import QIcon
+    from app.time_freq import TimeFreq
 
-print('CURRENT DIRECTORY FOLDER : ', os.getcwd())
+    import matplotlib.pyplot as plt
+    plt.style.use('fivethirtyeight')
+
+    print('CURRENT DIRECTORY FOLDER : ', os.getcwd())
 
-if __name__ == '__main__':
     app = QApplication(sys.argv)
     main = TimeFreq()
     main.show()
@@ -0,0 +1,80 @@
+"""
+Tests of the Welch PSD of the raw data computed by the project, against
+mne psd_welch, on a recording with bad annotations
+"""
+import numpy as np
+import pytest
+
+mne = pytest.importorskip('mne')
+
+
+# ---------------------------------------------------------------------
+def _annotated_raw():
+    """Returns a random raw with two bad segments"""
+    rng = np.random.RandomState(0)
+    info = mne.create_info(['EEG {}'.format(i) for i in range(4)], 256.,
+                           ch_types='eeg')
+    raw = mne.io.RawArray(rng.randn(4, 256 * 40) * 1e-6, info,
+                          verbose=False)
+    raw.set_annotations(mne.Annotations(onset=[3.3, 20.], duration=[2., .5],
+                                        description=['BAD_1', 'BAD_2']))
+    return raw
+
+
+# ---------------------------------------------------------------------
+def _mne_psd_welch(raw, n_fft=256, **kwargs):
+    """Returns the PSD of mne psd_welch, which reads the bad segments as
+    NaN and averages the periodograms of its segments with nanmean
+    """
+    from mne.time_frequency import psd_array_welch
+
+    psd_welch = getattr(mne.time_frequency, 'psd_welch', None)
+    if psd_welch is not None:
+        return psd_welch(raw, n_fft=n_fft, verbose=False, **kwargs)
+
+    # Recent versions of mne average the good spans separately, so the
+    # periodograms of the segments without NaN are averaged here
+    data = raw.get_data(reject_by_annotation='NaN')
+    n_segments = data.shape[1] // n_fft
+    segments = data[:, :n_segments * n_fft].reshape(len(data), n_segments,
+                                                    n_fft)
+    segments = segments.transpose(1, 0, 2)
+    segments = segments[~np.isnan(segments).any(axis=(1, 2))]
+    psds, freqs = psd_array_welch(segments, raw.info['sfreq'], n_fft=n_fft,
+                                  verbose=False, **kwargs)
+    return psds.mean(axis=0), freqs
+
+
+# ---------------------------------------------------------------------
+@pytest.mark.parametrize('chunk_size', [None, 1000])
+def test_welch_stream_annotations(chunk_size):
+    """The streamed PSD leaves the bad segments out as mne does"""
+    from backend.welch import psd_raw_welch_stream
+
+    raw = _annotated_raw()
+    psds_mne, freqs_mne = _mne_psd_welch(raw, n_fft=256)
+    psds, freqs = psd_raw_welch_stream(raw, n_fft=256,
+                                       chunk_size=chunk_size)
+    np.testing.assert_allclose(freqs, freqs_mne)
+    np.testing.assert_allclose(psds, psds_mne, rtol=1e-10)
+
+
+# ---------------------------------------------------------------------
+def test_raw_psd_numpy_engine_annotations():
+    """RawPSD gives the PSD of mne with the numpy engine, which is also
+    used when target_freqs is set
+    """
+    pytest.importorskip('matplotlib')
+    from backend.raw_psd import RawPSD
+
+    raw = _annotated_raw()
+    psds_mne, freqs_mne = _mne_psd_welch(raw, fmin=0, fmax=100, n_fft=256)
+    psd = RawPSD(raw, fmin=0, fmax=100, method='welch', n_fft=256,
+                 engine='numpy')
+    np.testing.assert_allclose(psd.freqs, freqs_mne)
+    np.testing.assert_allclose(psd.data, psds_mne, rtol=1e-10)
+
+    psd = RawPSD(raw, fmin=0, fmax=100, method='welch', n_fft=256,
+                 target_freqs=[10., 50.])
+    index = np.searchsorted(freqs_mne, [10., 50.])
+    np.testing.assert_allclose(psd.data, psds_mne[:, index], rtol=1e-8)
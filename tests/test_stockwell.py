@@ -0,0 +1,42 @@
+"""
+Tests of the Stockwell transform computed by blocks of frequencies,
+against mne tfr_array_stockwell
+"""
+import numpy as np
+import pytest
+
+mne = pytest.importorskip('mne')
+
+
+# ---------------------------------------------------------------------
+@pytest.mark.parametrize('block_size, batch_size', [(1, 1), (7, 2),
+                                                    (100, 32)])
+def test_stockwell_blocks(block_size, batch_size):
+    """The power, the ITC and the frequencies are the ones of mne, for any
+    size of the blocks of frequencies and of the batches of epochs
+    """
+    from mne.time_frequency import tfr_array_stockwell as mne_stockwell
+    from backend.stockwell import tfr_array_stockwell
+
+    data = np.random.RandomState(0).randn(5, 3, 300)
+    ref_psd, ref_itc, ref_freqs = mne_stockwell(
+        data, 200., fmin=5., fmax=60., width=1.2, return_itc=True,
+        verbose=False)
+    psd, itc, freqs = tfr_array_stockwell(
+        data, 200., fmin=5., fmax=60., width=1.2, return_itc=True,
+        block_size=block_size, batch_size=batch_size)
+    np.testing.assert_allclose(freqs, ref_freqs)
+    np.testing.assert_allclose(psd, ref_psd, rtol=1e-10)
+    np.testing.assert_allclose(itc, ref_itc, atol=1e-10)
+
+
+# ---------------------------------------------------------------------
+def test_stockwell_decim():
+    """The decimated transform keeps one time point every decim"""
+    from backend.stockwell import tfr_array_stockwell
+
+    data = np.random.RandomState(0).randn(4, 2, 256)
+    psd, _, _ = tfr_array_stockwell(data, 128., fmin=4., fmax=40.)
+    decimated, _, _ = tfr_array_stockwell(data, 128., fmin=4., fmax=40.,
+                                          decim=3)
+    np.testing.assert_allclose(decimated, psd[..., ::3], rtol=1e-10)
@@ -0,0 +1,65 @@
+"""
+Tests of the PSD computed only at the bins closest to target frequencies,
+against the same bins of the whole spectrum
+"""
+import numpy as np
+import pytest
+
+SFREQ = 250.
+TARGETS = [0., 10., 10.2, 33.3, 125.]
+
+
+# ---------------------------------------------------------------------
+def _signals():
+    """Returns random signals of shape (3, 2, 1000)"""
+    return np.random.RandomState(0).randn(3, 2, 1000)
+
+
+# ---------------------------------------------------------------------
+def test_target_bins():
+    """The bins are the closest ones, sorted, unique and in the one-sided
+    spectrum
+    """
+    from backend.welch import _target_bins
+
+    bins = _target_bins(256, SFREQ, [300., 10., 10.2, -5.])
+    np.testing.assert_array_equal(bins, [0, 10, 128])
+
+
+# ---------------------------------------------------------------------
+@pytest.mark.parametrize('n_fft, n_per_seg, n_overlap',
+                         [(256, None, 0), (255, None, 100), (256, 200, 50)])
+def test_welch_target_freqs(n_fft, n_per_seg, n_overlap):
+    """The Welch PSD of the target bins, including the DC and Nyquist
+    ones, is the one of the whole spectrum
+    """
+    from backend.welch import psd_array_welch
+
+    x = _signals()
+    kwargs = dict(n_fft=n_fft, n_per_seg=n_per_seg, n_overlap=n_overlap)
+    psds, freqs = psd_array_welch(x, SFREQ, **kwargs)
+    target_psds, target_freqs = psd_array_welch(x, SFREQ,
+                                                target_freqs=TARGETS,
+                                                **kwargs)
+    index = [np.abs(freqs - freq).argmin() for freq in TARGETS]
+    index = sorted(set(index))
+    np.testing.assert_allclose(target_freqs, freqs[index])
+    np.testing.assert_allclose(target_psds, psds[..., index], rtol=1e-8)
+
+
+# ---------------------------------------------------------------------
+@pytest.mark.parametrize('n_times', [1000, 999])
+def test_multitaper_target_freqs(n_times):
+    """The multitaper PSD of the target bins is the one of the whole
+    spectrum
+    """
+    from backend.multitaper import psd_array_multitaper
+
+    x = _signals()[..., :n_times]
+    psds, freqs = psd_array_multitaper(x, SFREQ, fmax=100.)
+    target_psds, target_freqs = psd_array_multitaper(
+        x, SFREQ, fmax=100., target_freqs=TARGETS)
+    index = sorted(set(np.abs(freqs - freq).argmin() for freq in TARGETS
+                       if freq <= 100.))
+    np.testing.assert_allclose(target_freqs, freqs[index])
+    np.testing.assert_allclose(target_psds, psds[..., index], rtol=1e-8)
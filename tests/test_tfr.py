@@ -0,0 +1,163 @@
+"""
+Tests of the averaged time-frequency engine of the project, against mne
+tfr_array_morlet and against the direct convolutions with the wavelets
+"""
+import numpy as np
+import pytest
+
+mne = pytest.importorskip('mne')
+
+SFREQ = 256.
+FREQS = np.arange(8., 40., 4.)
+
+
+# ---------------------------------------------------------------------
+def _epochs_data(n_epochs=5, n_channels=3, n_times=512):
+    """Returns random signals of shape (n_epochs, n_channels, n_times)"""
+    rng = np.random.RandomState(0)
+    return rng.randn(n_epochs, n_channels, n_times)
+
+
+# ---------------------------------------------------------------------
+def _direct_coefs(data, Ws):
+    """Returns the convolutions of data with each wavelet of Ws, centered
+    as in mne, of shape (n_epochs, n_channels, n_freqs, n_times)
+    """
+    return np.array([[[np.convolve(signal, W, mode='same') for W in Ws]
+                      for signal in epoch] for epoch in data])
+
+
+# ---------------------------------------------------------------------
+def test_morlet_power_itc():
+    """The Morlet power and ITC are the ones of mne"""
+    from mne.time_frequency import tfr_array_morlet
+    from backend.tfr import morlet_bank, tfr_power_avg
+
+    data = _epochs_data()
+    ref = tfr_array_morlet(data, SFREQ, FREQS, n_cycles=5.,
+                           output='avg_power_itc', verbose=False)
+    power, itc = tfr_power_avg(data, morlet_bank(SFREQ, FREQS, 5.),
+                               [0, 1, 2], return_itc=True)
+    np.testing.assert_allclose(power, ref.real, rtol=1e-10)
+    np.testing.assert_allclose(itc, ref.imag, atol=1e-10)
+
+
+# ---------------------------------------------------------------------
+def test_multitaper_power_itc():
+    """The multitaper power and ITC are the averages over the tapers of
+    the direct convolutions with the wavelets
+    """
+    from backend.multitaper import make_dpss_wavelets
+    from backend.tfr import dpss_banks, tfr_power_avg
+
+    data = _epochs_data()
+    n_cycles = FREQS / 2.
+    power, itc = tfr_power_avg(data, dpss_banks(SFREQ, FREQS, n_cycles, 4.),
+                               [0, 1, 2], return_itc=True)
+
+    coefs = np.array([_direct_coefs(data, Ws) for Ws in
+                      make_dpss_wavelets(SFREQ, FREQS, n_cycles, 4.)])
+    ref_power = (np.abs(coefs) ** 2).mean(axis=(0, 1))
+    ref_itc = np.abs((coefs / np.abs(coefs)).mean(axis=1)).mean(axis=0)
+    np.testing.assert_allclose(power, ref_power, rtol=1e-10)
+    np.testing.assert_allclose(itc, ref_itc, atol=1e-10)
+
+
+# ---------------------------------------------------------------------
+def test_picks():
+    """Only the picked channels are computed, in the order of picks"""
+    from backend.tfr import morlet_bank, tfr_power_avg
+
+    data = _epochs_data()
+    bank = morlet_bank(SFREQ, FREQS, 5.)
+    power = tfr_power_avg(data, bank, [0, 1, 2])
+    np.testing.assert_allclose(tfr_power_avg(data, bank, [2, 0]),
+                               power[[2, 0]])
+
+
+# ---------------------------------------------------------------------
+@pytest.mark.parametrize('batch_size', [1, 2, 32])
+def test_variance_batches(batch_size):
+    """The running mean and variance over batches of epochs are the ones
+    of the power of all the epochs
+    """
+    from mne.time_frequency import tfr_array_morlet
+    from backend.tfr import morlet_bank, tfr_power_avg
+
+    data = _epochs_data()
+    ref = tfr_array_morlet(data, SFREQ, FREQS, n_cycles=5., output='power',
+                           verbose=False)
+    power, var = tfr_power_avg(data, morlet_bank(SFREQ, FREQS, 5.),
+                               [0, 1, 2], batch_size=batch_size,
+                               return_var=True)
+    np.testing.assert_allclose(power, ref.mean(axis=0), rtol=1e-10)
+    np.testing.assert_allclose(var, ref.var(axis=0, ddof=1), rtol=1e-8)
+
+
+# ---------------------------------------------------------------------
+def test_stream_epochs():
+    """The epochs read batch by batch give the same results as the whole
+    data
+    """
+    from backend.tfr import morlet_bank, tfr_power_avg, tfr_power_stream
+
+    data = _epochs_data()
+    info = mne.create_info(3, SFREQ, ch_types='eeg')
+    epochs = mne.EpochsArray(data, info, verbose=False)
+    bank = morlet_bank(SFREQ, FREQS, 5.)
+    ref = tfr_power_avg(data, bank, [0, 2], return_itc=True,
+                        return_var=True)
+    result = tfr_power_stream(epochs, bank, [0, 2], batch_size=2,
+                              return_itc=True, return_var=True)
+    for values, ref_values in zip(result, ref):
+        np.testing.assert_allclose(values, ref_values, rtol=1e-8,
+                                   atol=1e-12)
+
+
+# ---------------------------------------------------------------------
+def test_itc_flat_channel():
+    """A flat channel has no phase, and does not give NaN"""
+    from backend.tfr import morlet_bank, tfr_power_avg
+
+    data = _epochs_data()
+    data[:, 1] = 0.
+    power, itc = tfr_power_avg(data, morlet_bank(SFREQ, FREQS, 5.),
+                               [0, 1, 2], return_itc=True)
+    assert np.isfinite(itc).all()
+    np.testing.assert_array_equal(itc[1], 0.)
+
+
+# ---------------------------------------------------------------------
+@pytest.mark.parametrize('decim', [2, 3, 7])
+def test_decim(decim):
+    """The decimated TFR is the one of mne, and the time points kept from
+    the whole TFR
+    """
+    from mne.time_frequency import tfr_array_morlet
+    from backend.tfr import dpss_banks, morlet_bank, tfr_power_avg
+
+    data = _epochs_data(n_times=500)
+    ref = tfr_array_morlet(data, SFREQ, FREQS, n_cycles=5., decim=decim,
+                           output='avg_power_itc', verbose=False)
+    power, itc = tfr_power_avg(data, morlet_bank(SFREQ, FREQS, 5.),
+                               [0, 1, 2], return_itc=True, decim=decim)
+    np.testing.assert_allclose(power, ref.real, rtol=1e-10)
+    np.testing.assert_allclose(itc, ref.imag, atol=1e-10)
+
+    banks = dpss_banks(SFREQ, FREQS, FREQS / 2., 4.)
+    full = tfr_power_avg(data, banks, [0, 1, 2])
+    power = tfr_power_avg(data, banks, [0, 1, 2], decim=decim)
+    np.testing.assert_allclose(power, full[..., ::decim], rtol=1e-10)
+
+
+# ---------------------------------------------------------------------
+def test_float32():
+    """The TFR computed in single precision is close to the double one"""
+    from backend.tfr import morlet_bank, tfr_power_avg
+
+    data = _epochs_data()
+    bank = morlet_bank(SFREQ, FREQS, 5.)
+    ref = tfr_power_avg(data, bank, [0, 1, 2], decim=2)
+    power = tfr_power_avg(data, bank, [0, 1, 2], decim=2, dtype='float32')
+    assert power.dtype == np.float32
+    np.testing.assert_allclose(power, ref, rtol=1e-3, atol=1e-5 * ref.max())
@@ -0,0 +1,79 @@
+"""
+Tests of the topomap renderer, whose interpolation matrix gives the same
+maps as the Clough-Tocher interpolation of scipy griddata
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip('scipy')
+
+
+# ---------------------------------------------------------------------
+def _positions(n_channels=20):
+    """Returns random positions of electrodes in a disc"""
+    rng = np.random.RandomState(0)
+    angles = rng.uniform(0, 2 * np.pi, n_channels)
+    radius = np.sqrt(rng.uniform(0, 1, n_channels))
+    return np.c_[radius * np.cos(angles), radius * np.sin(angles)]
+
+
+# ---------------------------------------------------------------------
+def _griddata_map(renderer, values, res):
+    """Returns the map interpolated directly by griddata, with zeros on
+    the points around the electrodes as in mne
+    """
+    from itertools import product
+    from scipy.interpolate import griddata
+
+    pos = renderer.pos
+    extremes = np.array([pos.min(axis=0), pos.max(axis=0)])
+    diffs = extremes[1] - extremes[0]
+    extremes[0] -= diffs
+    extremes[1] += diffs
+    outer = np.array([[extremes[i, 0], extremes[j, 1]]
+                      for i, j in product((0, 1), repeat=2)])
+    grid = np.linspace(-renderer.radius, renderer.radius, res)
+    xi, yi = np.meshgrid(grid, grid)
+    data = griddata(np.concatenate((pos, outer)),
+                    np.concatenate((values, np.zeros(len(outer)))),
+                    (xi, yi), method='cubic')
+    return np.nan_to_num(data)
+
+
+# ---------------------------------------------------------------------
+@pytest.mark.parametrize('res', [16, 64])
+def test_interpolate(res):
+    """The maps of the interpolation matrix are the ones of griddata, up
+    to the tolerance of the iterative estimation of the gradients, which
+    makes the interpolation linear only approximately
+    """
+    from backend.topomap import TopomapRenderer
+
+    renderer = TopomapRenderer(_positions())
+    rng = np.random.RandomState(1)
+    for _ in range(3):
+        values = rng.randn(len(renderer.pos))
+        np.testing.assert_allclose(renderer.interpolate(values, res),
+                                   _griddata_map(renderer, values, res),
+                                   atol=1e-6)
+
+
+# ---------------------------------------------------------------------
+def test_plot_update():
+    """Updating a topomap gives the data and the color limits of a new
+    one
+    """
+    matplotlib = pytest.importorskip('matplotlib')
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from backend.topomap import TopomapRenderer
+
+    renderer = TopomapRenderer(_positions())
+    values = np.random.RandomState(1).randn(2, len(renderer.pos))
+    fig, (ax, ax_ref) = plt.subplots(1, 2)
+    image = renderer.plot(values[0], ax)
+    assert renderer.plot(values[1], ax, image=image) is image
+    ref = renderer.plot(values[1], ax_ref)
+    np.testing.assert_allclose(image.get_array(), ref.get_array())
+    assert image.get_clim() == ref.get_clim()
+    plt.close(fig)